@@ -0,0 +1,145 @@
+"""Inverted indexes from mnemonics, RWCL ids and material numbers to cells.
+
+The indexes answer questions like "which cells are made of material X",
+without scanning the whole cells table.
+In memory an index is a map key -> sorted array of cell numbers.
+In SQLite database the indexes are stored in the table `cells_index`
+clustered by kind and key.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Final
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    import sqlite3 as sq
+
+INDEX_KINDS: Final[dict[str, str]] = {
+    "mnemonic": "mnemonic",
+    "rwcl": "rwcl",
+    "material": "material_number",
+}
+"""Kinds of indexes and corresponding columns in a cells table."""
+
+CellsIndex = dict[str, dict[str, np.ndarray]]
+"""Mapping kind -> key -> sorted cell numbers."""
+
+
+def build_cells_index(cells: pd.DataFrame) -> CellsIndex:
+    """Build inverted indexes for a cells table.
+
+    Args:
+        cells: table indexed by cell numbers with the columns `mnemonic`, `rwcl`
+               and `material_number`, the missed columns are skipped
+
+    Returns:
+        The indexes for every kind.
+    """
+    result: CellsIndex = {}
+    for kind, column in INDEX_KINDS.items():
+        if column not in cells.columns:
+            continue
+        keys = _keys(cells[column])
+        defined = keys.notna().to_numpy()
+        numbers = cells.index.to_numpy()[defined]
+        groups = pd.Series(numbers).groupby(keys[defined].to_numpy(), sort=True)
+        result[kind] = {str(k): np.sort(v.to_numpy()) for k, v in groups}
+    return result
+
+
+def save_cells_index(con: sq.Connection, cells: pd.DataFrame) -> None:
+    """Store inverted indexes for a cells table to a database.
+
+    The previous content of the table `cells_index` is replaced.
+
+    Args:
+        con: connection to database
+        cells: table indexed by cell numbers with the columns `mnemonic`, `rwcl`
+               and `material_number`, the missed columns are skipped
+    """
+    con.executescript(
+        """
+        drop table if exists cells_index;
+        create table cells_index (
+            kind text not null,
+            key text not null,
+            cell integer not null,
+            primary key (kind, key, cell)
+        ) without rowid;
+        """,
+    )
+    update_cells_index(con, cells)
+
+
+def update_cells_index(con: sq.Connection, cells: pd.DataFrame) -> None:
+    """Replace the stored inverted indexes for the columns present in a cells table.
+
+    The indexes of the other kinds are kept, so, for example, the material index
+    can be updated after renumbering of materials.
+
+    Args:
+        con: connection to database with the table `cells_index`
+        cells: table indexed by cell numbers with some of the columns `mnemonic`, `rwcl`
+               and `material_number`
+    """
+    for kind, groups in build_cells_index(cells).items():
+        con.execute("delete from cells_index where kind = ?", (kind,))
+        con.executemany(
+            "insert into cells_index (kind, key, cell) values (?, ?, ?)",
+            ((kind, key, cell) for key, numbers in groups.items() for cell in numbers.tolist()),
+        )
+    con.commit()
+
+
+def query_cells(con: sq.Connection, kind: str, key: str | int) -> list[int]:
+    """Find cells by a key in the stored inverted index.
+
+    Args:
+        con: connection to database
+        kind: one of `mnemonic`, `rwcl` or `material`
+        key: mnemonic, RWCL id or material number
+
+    Returns:
+        Sorted cell numbers.
+    """
+    _check_kind(kind)
+    return [
+        r[0]
+        for r in con.execute(
+            "select cell from cells_index where kind = ? and key = ? order by cell",
+            (kind, str(key)),
+        )
+    ]
+
+
+def list_keys(con: sq.Connection, kind: str) -> list[tuple[str, int]]:
+    """List keys of a stored inverted index with number of cells.
+
+    Args:
+        con: connection to database
+        kind: one of `mnemonic`, `rwcl` or `material`
+
+    Returns:
+        Pairs (key, number of cells) ordered by key.
+    """
+    _check_kind(kind)
+    return con.execute(
+        "select key, count(*) from cells_index where kind = ? group by key order by key",
+        (kind,),
+    ).fetchall()
+
+
+def _keys(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_float_dtype(column):
+        # material numbers with NaN for void cells
+        return column.astype("Int64").astype("string")
+    return column.astype("string")
+
+
+def _check_kind(kind: str) -> None:
+    if kind not in INDEX_KINDS:
+        msg = f"Unknown index kind {kind!r}, expected one of {', '.join(INDEX_KINDS)}"
+        raise ValueError(msg)
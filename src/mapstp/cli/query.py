@@ -0,0 +1,63 @@
+"""Application to query cells by mnemonic, RWCL id or material number.
+
+Uses the inverted indexes stored by `mapstp` in the SQLite database.
+"""
+
+from __future__ import annotations
+
+import sqlite3 as sq
+
+import click
+
+from mapstp import __version__
+from mapstp.cells_index import INDEX_KINDS, list_keys, query_cells
+
+_USAGE = """
+Print numbers of cells with given KIND (mnemonic, rwcl or material) and KEY.
+
+The SQL-FILE is a database processed with mapstp.
+"""
+
+
+@click.command(help=_USAGE, name="mapstp-cells")
+@click.option(
+    "--list",
+    "list_kind",
+    type=click.Choice(list(INDEX_KINDS)),
+    required=False,
+    help="List the keys of the index with number of cells instead of querying cells",
+)
+@click.argument("sql", metavar="<sql-file>", type=click.Path(dir_okay=False, exists=True))
+@click.argument("kind", metavar="[kind]", type=click.Choice(list(INDEX_KINDS)), required=False)
+@click.argument("key", metavar="[key]", required=False)
+@click.version_option(__version__, prog_name="mapstp-cells")
+@click.help_option()
+def mapstp_cells(sql: str, kind: str | None, key: str | None, list_kind: str | None) -> None:
+    """Print numbers of cells found in the inverted indexes.
+
+    Args:
+        sql: database with table cells_index
+        kind: mnemonic, rwcl or material
+        key: value to search for
+        list_kind: kind of index to list keys for
+
+    Raises:
+        UsageError: if neither kind and key, nor --list are specified
+    """
+    con = sq.connect(sql)
+    try:
+        if list_kind:
+            for _key, count in list_keys(con, list_kind):
+                click.echo(f"{_key}\t{count}")
+            return
+        if not (kind and key):
+            msg = "Specify both kind and key, or use --list"
+            raise click.UsageError(msg)
+        for cell in query_cells(con, kind, key):
+            click.echo(cell)
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    mapstp_cells()
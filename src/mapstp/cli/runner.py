@@ -23,21 +23,63 @@ to the meta information provided in the STP.
 
 from __future__ import annotations
 
+from typing import TYPE_CHECKING, Any
+
 import sqlite3 as sq
 
+from contextlib import closing
 from dataclasses import dataclass
+from importlib.util import find_spec
 from pathlib import Path
 
 import click
 
 from mapstp import __name__ as package_name
 from mapstp import __summary__, __version__
+from mapstp.cells_index import save_cells_index
 from mapstp.cli.mapstp_logging import init_logger, logger
-from mapstp.materials import get_used_materials_sql, load_materials_map
-from mapstp.merge import merge_paths
-from mapstp.save_table import create_excel
-from mapstp.utils import can_override, select_output
-from mapstp.workflow_sql import load_path_info, save_meta_info_from_paths
+from mapstp.materials import (
+    compact_used_materials,
+    iter_used_materials,
+    used_material_numbers_sql,
+)
+from mapstp.materials_index import empty_materials_index, load_materials_index
+from mapstp.materials_library import MaterialsLibrary
+from mapstp.merge import find_cells_with_materials, merge_paths
+from mapstp.rules import load_rules
+from mapstp.save_table import (
+    CELL_INFO_COLUMNS,
+    CELL_TABLE_WRITERS,
+    create_csv,
+    create_excel,
+    create_sql,
+    iter_cell_records,
+    write_ndjson,
+)
+from mapstp.utils import (
+    COMPRESSED_SUFFIXES,
+    can_override,
+    open_text_output,
+    read_mcnp_sections,
+    select_output,
+)
+from mapstp.workflow_sql import (
+    collect_cells_meta_info,
+    create_scenarios_path_info,
+    iter_path_info,
+    load_path_info,
+    save_material_numbers,
+    save_meta_info_from_paths,
+    validate_scenarios_meta_info,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    import pandas as pd
+
+    from mapstp.validation import ValidationReport
+    from mapstp.workflow_sql import CellsMetaInfo
 
 
 @dataclass
@@ -47,6 +89,8 @@ class Config:
     override: bool = False
 
 
+_MAX_REPORTED_CELLS = 10
+
 _USAGE = f"""
 {__summary__}
 
@@ -68,13 +112,30 @@ to the meta information provided in the STP.
     default=False,
     help="Override existing files, (default: no)",
 )
+@click.option(
+    "--check",
+    is_flag=True,
+    default=False,
+    help="Only validate tags and material index for all the cells and print the report, "
+    "don't write any output",
+)
 @click.option(
     "--output",
     "-o",
     metavar="<output>",
     type=click.Path(dir_okay=False),
     required=False,
-    help="File to write the MCNP with marked cells (default: stdout)",
+    help="File to write the MCNP with marked cells (default: stdout). "
+    "The file is compressed, if the suffix is .gz, .xz or .bz2, "
+    "the same for `--csv` and `--ndjson`",
+)
+@click.option(
+    "--compression-level",
+    metavar="<level>",
+    type=click.IntRange(min=1, max=9),
+    required=False,
+    help="Compression level for the outputs with suffix .gz, .xz or .bz2 "
+    "(default: the format default)",
 )
 @click.option(
     "--excel",
@@ -90,7 +151,44 @@ to the meta information provided in the STP.
     metavar="<sql-file>",
     type=click.Path(dir_okay=False),
     required=False,
-    help="SQLite3 file with the model information",
+    help="SQLite3 file with the model information, "
+    "the table 'cells_index' is added (or replaced) in an existing file",
+)
+@click.option(
+    "--parquet",
+    metavar="<parquet-file>",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="Parquet file to write the cells table with typed columns, requires pyarrow",
+)
+@click.option(
+    "--feather",
+    metavar="<feather-file>",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="Feather (Arrow IPC) file to write the cells table with typed columns, requires pyarrow",
+)
+@click.option(
+    "--csv",
+    metavar="<csv-file>",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="CSV file to write the cells table",
+)
+@click.option(
+    "--shared-table",
+    metavar="<directory>",
+    type=click.Path(file_okay=False),
+    required=False,
+    help="Directory to write the cells table as memory mapped NumPy arrays "
+    "to be shared by worker processes, see mapstp.shared_table",
+)
+@click.option(
+    "--ndjson",
+    metavar="<ndjson-file>",
+    type=click.Path(dir_okay=False),
+    required=False,
+    help="File to write the cells information as JSON record per line",
 )
 @click.option(
     "--materials",
@@ -99,16 +197,70 @@ to the meta information provided in the STP.
     required=False,
     help="Text file containing MCNP materials specifications. "
     "If present, the selected materials present in this file are printed "
-    "to the `output` MCNP model, so, it becomes complete valid model",
+    "to the `output` MCNP model, so, it becomes complete valid model. "
+    "The file can be compressed: .zip, .gz, .xz or .bz2",
+)
+@click.option(
+    "--materials-member",
+    metavar="<member>",
+    required=False,
+    help="Name of the materials file in the zip archive specified with `--materials`, "
+    "required if the archive contains several files",
+)
+@click.option(
+    "--merge-materials",
+    is_flag=True,
+    default=False,
+    help="Replace the used materials having the same composition with one of them. "
+    "Requires `--materials`",
+)
+@click.option(
+    "--renumber-materials",
+    is_flag=True,
+    default=False,
+    help="Number the used materials from 1 in the `output` MCNP model and accompanying excel. "
+    "Requires `--materials` and the model without materials set in cells",
 )
 @click.option(
     "--materials-index",
     "-m",
     metavar="<materials-index-file>",
     type=click.Path(dir_okay=False, exists=True),
+    multiple=True,
+    required=False,
+    help="Excel, CSV, TSV, SQLite, JSON or TOML file containing materials mnemonics "
+    "and corresponding references for MCNP model "
+    "(default: file from the package internal data corresponding to ITER C-model). "
+    "If the option is repeated, the outputs are created for every index "
+    "with the index file name appended to the output file names",
+)
+@click.option(
+    "--materials-index-overlay",
+    "-M",
+    metavar="<overlay-index-file>",
+    type=click.Path(dir_okay=False, exists=True),
+    multiple=True,
+    required=False,
+    help="Material index overriding the mnemonics of every `--materials-index` "
+    "(or the default one). If the option is repeated, the later files override the earlier",
+)
+@click.option(
+    "--rules",
+    "-r",
+    metavar="<rules-file>",
+    type=click.Path(dir_okay=False, exists=True),
     required=False,
-    help="Excel file containing materials mnemonics and corresponding references for MCNP model "
-    "(default: file from the package internal data corresponding to ITER C-model)",
+    help="Text file with lines '<path pattern> [<tags>]' assigning tags to the matching paths. "
+    "The tags in the STP paths override the ones from the rules",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    metavar="<jobs>",
+    type=click.IntRange(min=0),
+    default=1,
+    show_default=True,
+    help="Number of processes to extract tags from STP paths, 0 - use all CPUs",
 )
 @click.argument(
     "mcnp",
@@ -122,54 +274,358 @@ to the meta information provided in the STP.
 def mapstp(  # noqa: PLR0913
     ctx: click.Context,
     output: str,
+    compression_level: int | None,
     excel: str,
     sql: str,
+    parquet: str | None,
+    feather: str | None,
+    csv: str | None,
+    shared_table: str | None,
+    ndjson: str | None,
     materials: str | None,
-    materials_index: str,
+    materials_member: str | None,
+    materials_index: tuple[str, ...],
+    materials_index_overlay: tuple[str, ...],
+    rules: str | None,
+    jobs: int,
     mcnp: str,
     *,
+    merge_materials: bool,
+    renumber_materials: bool,
     override: bool,
+    check: bool,
 ) -> None:
     """Transfers meta information from STP to MCNP model and Excel.
 
     Args:
         ctx: context object
         output: where to store resulting mcnp
+        compression_level: compression level for compressed outputs
         excel: excel to store mapping cell->tags, stp path, volume(if available)
         sql: as above but in SQLite3 table 'cell_info'
+        parquet: as above but in Parquet file
+        feather: as above but in Feather file
+        csv: as above but in CSV file
+        shared_table: as above but in directory of memory mapped files
+        ndjson: as above but in JSON record per line, bounding boxes included
         materials: file with MCNP materials
-        materials_index: excel with mnemonics mapping to materials and densities
+        materials_member: materials file name in zip archive `materials`
+        materials_index: excels with mnemonics mapping to materials and densities,
+                         several ones to produce output for every of them
+        materials_index_overlay: indexes overriding every of `materials_index`
+        rules: file with tagging rules
+        jobs: number of processes to extract tags, 0 - all CPUs
         mcnp: input MCNP model - to be tagged in output
         override: override existing files if any, if false - raise exception
+        check: only validate meta information and report found issues
+        merge_materials: merge used materials with the same compositions
+        renumber_materials: renumber used materials densely
+
+    Raises:
+        ClickException: if tags or material index are not valid.
     """
     if not (mcnp or excel):
         msg = "Nor `excel`, neither `mcnp` parameter is specified - nothing to do"
         raise click.UsageError(msg)
+    tables = _select_cell_tables(
+        parquet=parquet,
+        feather=feather,
+        csv=csv,
+        shared_table=shared_table,
+    )
     init_logger()
     logger.info("Running mapstp {}", __version__)
     cfg = ctx.ensure_object(Config)
     cfg.override = override
     con = sq.connect(sql)
     try:
-        save_meta_info_from_paths(con, materials_index)
-        if materials:
-            materials_map = load_materials_map(materials)
-            used_materials_text = get_used_materials_sql(con, materials_map)
-        else:
-            used_materials_text = None
+        _rules = load_rules(rules) if rules else None
+        # the tags are extracted once for validation and all the scenarios
+        collected = collect_cells_meta_info(con, jobs, rules=_rules)
+        scenarios = _load_scenarios(
+            materials_index,
+            materials_index_overlay,
+            has_mnemonics=collected.has_mnemonics,
+        )
+        reports = validate_scenarios_meta_info(
+            con,
+            list(scenarios.values()),
+            collected=collected,
+        )
+        if check:
+            _report_check(ctx, scenarios, reports)
+            return
+        _stop_on_issues(scenarios, reports)
+        materials_map = MaterialsLibrary(materials, materials_member) if materials else None
         _mcnp = Path(mcnp)
-        logger.info("Tagging model {}", mcnp)
-        with select_output(output, override=override) as _output:
+        compact = merge_materials or renumber_materials
+        if compact:
+            _check_compaction(_mcnp, materials_map, renumber_materials=renumber_materials)
+        if len(scenarios) == 1:
+            save_meta_info_from_paths(con, next(iter(scenarios.values())), collected=collected)
             path_info = load_path_info(con)
-            merge_paths(_output, path_info, _mcnp, used_materials_text)
-        _excel = Path(excel) if excel else Path(_mcnp.stem + "-cells.xlsx")
-        can_override(_excel, override=override)
-        create_excel(_excel, path_info)
-        logger.info("Accompanying excel is saved to {}", _excel)
+            used_materials: Iterable[str] | None = None
+            if materials_map is not None and compact:
+                path_info, used_materials = compact_used_materials(
+                    materials_map,
+                    path_info,
+                    merge_duplicates=merge_materials,
+                    renumber=renumber_materials,
+                )
+                save_material_numbers(con, path_info)
+            elif materials_map is not None:
+                used_materials = iter_used_materials(
+                    materials_map,
+                    used_material_numbers_sql(con),
+                )
+            logger.info("Tagging model {}", mcnp)
+            with select_output(
+                output,
+                override=override,
+                compression_level=compression_level,
+            ) as _output:
+                merge_paths(_output, path_info, _mcnp, used_materials)
+            _excel = Path(excel) if excel else Path(_mcnp.stem + "-cells.xlsx")
+            can_override(_excel, override=override)
+            create_excel(_excel, path_info)
+            logger.info("Accompanying excel is saved to {}", _excel)
+            _save_cell_tables(
+                path_info,
+                tables,
+                override=override,
+                compression_level=compression_level,
+            )
+            if ndjson:
+                # without compaction the rows are streamed from the database
+                rows = iter_cell_records(path_info) if compact else iter_path_info(con)
+                _save_ndjson(
+                    Path(ndjson),
+                    rows,
+                    override=override,
+                    compression_level=compression_level,
+                )
+        else:
+            _run_scenarios(
+                con,
+                scenarios,
+                materials_map,
+                _mcnp,
+                output=output,
+                excel=excel,
+                sql=sql,
+                collected=collected,
+                tables=tables,
+                ndjson=ndjson,
+                override=override,
+                compression_level=compression_level,
+                merge_materials=merge_materials,
+                renumber_materials=renumber_materials,
+            )
         logger.success("mapstp finished")
     finally:
         con.close()
 
 
+def _check_compaction(
+    mcnp: Path,
+    materials_map: MaterialsLibrary | None,
+    *,
+    renumber_materials: bool,
+) -> None:
+    if materials_map is None:
+        msg = "The `--materials` option is required to merge or renumber materials"
+        raise click.UsageError(msg)
+    if not renumber_materials:
+        return
+    # the cells with materials in the model keep their numbers,
+    # which would refer to other materials after renumbering
+    cells = find_cells_with_materials(mcnp)
+    if cells:
+        shown = ", ".join(map(str, cells[:_MAX_REPORTED_CELLS]))
+        more = ", ..." if len(cells) > _MAX_REPORTED_CELLS else ""
+        msg = (
+            f"Cannot renumber materials: {len(cells)} cells in {mcnp} already have materials "
+            f"({shown}{more})"
+        )
+        raise click.UsageError(msg)
+
+
+def _load_scenarios(
+    materials_indexes: tuple[str, ...],
+    overlays: tuple[str, ...],
+    *,
+    has_mnemonics: bool,
+) -> dict[str, pd.DataFrame]:
+    if not materials_indexes and not has_mnemonics:
+        # nothing to resolve, don't load the default index
+        logger.info("No material mnemonics in the paths, material index is not used")
+        return {"default": empty_materials_index()}
+    if overlays:
+        logger.info("Material indexes are overridden with {}", ", ".join(overlays))
+    if not materials_indexes:
+        logger.info("Using material index from package data")
+        return {"default": load_materials_index([None, *overlays] if overlays else None)}
+    scenarios: dict[str, pd.DataFrame] = {}
+    for materials_index in materials_indexes:
+        name = Path(materials_index).stem
+        if name in scenarios:
+            msg = f"The material indexes should have different names, {name!r} is duplicated"
+            raise click.UsageError(msg)
+        scenarios[name] = load_materials_index(
+            [materials_index, *overlays] if overlays else materials_index,
+        )
+        logger.info("Loaded material index from {}", materials_index)
+    return scenarios
+
+
+def _report_check(
+    ctx: click.Context,
+    scenarios: dict[str, pd.DataFrame],
+    reports: list[ValidationReport],
+) -> None:
+    for name, report in zip(scenarios, reports, strict=True):
+        if len(scenarios) > 1:
+            click.echo(f"Material index {name!r}:")
+        click.echo(report.summary())
+    if not all(r.ok for r in reports):
+        ctx.exit(1)
+
+
+def _stop_on_issues(scenarios: dict[str, pd.DataFrame], reports: list[ValidationReport]) -> None:
+    failed = False
+    for name, report in zip(scenarios, reports, strict=True):
+        if not report.ok:
+            logger.error("Material index {!r}:\n{}", name, report.summary())
+            failed = True
+    if failed:
+        msg = "Tags or material index are not valid, nothing is written"
+        raise click.ClickException(msg)
+
+
+def _run_scenarios(  # noqa: PLR0913
+    con: sq.Connection,
+    scenarios: dict[str, pd.DataFrame],
+    materials_map: Mapping[int, str] | None,
+    mcnp: Path,
+    *,
+    output: str | None,
+    excel: str | None,
+    sql: str,
+    collected: CellsMetaInfo,
+    tables: Mapping[str, Path],
+    ndjson: str | None,
+    override: bool,
+    compression_level: int | None,
+    merge_materials: bool,
+    renumber_materials: bool,
+) -> None:
+    """Write tagged MCNP, Excel, SQLite and other cell table outputs for every material index.
+
+    The tags are extracted and the input MCNP is read once for all the scenarios.
+    The input database is not changed, every scenario database gets its own
+    table `cells_index` to be queried with `mapstp-cells`.
+    """
+    if not output:
+        msg = "The `output` is to be specified for several material indexes"
+        raise click.UsageError(msg)
+    sections = read_mcnp_sections(mcnp)
+    path_infos = create_scenarios_path_info(con, list(scenarios.values()), collected=collected)
+    _output = Path(output)
+    _excel = Path(excel) if excel else Path(mcnp.stem + "-cells.xlsx")
+    _sql = Path(sql)
+    # the rows of the collected meta information and the tables are ordered by cell
+    mnemonics = collected.meta_info["mnemonic"].to_numpy()
+    for name, path_info in zip(scenarios, path_infos, strict=True):
+        logger.info("Tagging model {} with material index {!r}", mcnp, name)
+        used_materials = None
+        if materials_map is not None:
+            path_info, used_materials = compact_used_materials(  # noqa: PLW2901
+                materials_map,
+                path_info,
+                merge_duplicates=merge_materials,
+                renumber=renumber_materials,
+            )
+        with select_output(
+            _scenario_path(_output, name),
+            override=override,
+            compression_level=compression_level,
+        ) as stream:
+            merge_paths(stream, path_info, sections, used_materials)
+        scenario_excel = can_override(_scenario_path(_excel, name), override=override)
+        create_excel(scenario_excel, path_info)
+        logger.info("Accompanying excel is saved to {}", scenario_excel)
+        scenario_sql = can_override(_scenario_path(_sql, name), override=override)
+        create_sql(scenario_sql, path_info[list(CELL_INFO_COLUMNS)])
+        with closing(sq.connect(scenario_sql)) as scenario_con:
+            save_cells_index(
+                scenario_con,
+                path_info[["material_number", "rwcl"]].assign(mnemonic=mnemonics),
+            )
+        logger.info("Cells information is saved to {}", scenario_sql)
+        _save_cell_tables(
+            path_info,
+            tables,
+            override=override,
+            compression_level=compression_level,
+            scenario=name,
+        )
+        if ndjson:
+            _save_ndjson(
+                _scenario_path(Path(ndjson), name),
+                iter_cell_records(path_info),
+                override=override,
+                compression_level=compression_level,
+            )
+
+
+def _save_ndjson(
+    path: Path,
+    rows: Iterable[Mapping[str, Any]],
+    *,
+    override: bool,
+    compression_level: int | None,
+) -> None:
+    can_override(path, override=override)
+    with open_text_output(path, compression_level) as stream:
+        count = write_ndjson(stream, rows)
+    logger.info("{} cells records are saved to {}", count, path)
+
+
+def _select_cell_tables(**outputs: str | None) -> dict[str, Path]:
+    tables = {output_format: Path(path) for output_format, path in outputs.items() if path}
+    arrow_formats = [f"--{f}" for f in ("parquet", "feather") if f in tables]
+    if arrow_formats and find_spec("pyarrow") is None:
+        msg = f"The {' and '.join(arrow_formats)} output requires pyarrow, install mapstp[arrow]"
+        raise click.UsageError(msg)
+    return tables
+
+
+def _save_cell_tables(
+    path_info: pd.DataFrame,
+    tables: Mapping[str, Path],
+    *,
+    override: bool,
+    compression_level: int | None,
+    scenario: str | None = None,
+) -> None:
+    cell_info = path_info[list(CELL_INFO_COLUMNS)]
+    for output_format, path in tables.items():
+        table = _scenario_path(path, scenario) if scenario else path
+        can_override(table, override=override)
+        if output_format == "csv":
+            create_csv(table, cell_info, compression_level)
+        else:
+            CELL_TABLE_WRITERS[output_format](table, cell_info)
+        logger.info("Cells information is saved to {}", table)
+
+
+def _scenario_path(path: Path, scenario: str) -> Path:
+    suffix = path.suffix
+    if suffix.lower() in COMPRESSED_SUFFIXES:
+        inner = Path(path.stem)
+        return path.with_name(f"{inner.stem}-{scenario}{inner.suffix}{suffix}")
+    return path.with_name(f"{path.stem}-{scenario}{suffix}")
+
+
 if __name__ == "__main__":
     mapstp()
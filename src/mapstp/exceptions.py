@@ -7,6 +7,8 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     import pandas as pd
 
+    from mapstp.validation import ValidationReport
+
 
 class MyError(ValueError):
     """Base class for exceptions in the `mapstp` package."""
@@ -28,6 +30,10 @@ class STPParserError(MyError):
         super().__init__(self, message)
 
 
+class RulesFileError(MyError):
+    """Syntax error in a tagging rules file."""
+
+
 class PathInfoError(MyError):
     """Error on extracting information for labels specified in STP paths."""
 
@@ -40,3 +46,16 @@ class PathInfoError(MyError):
             path_info: the path_info table
         """
         MyError.__init__(self, message + f" Row #{row}:\n" + f"{path_info.iloc[row].to_dict()}")
+
+
+class ValidationError(MyError):
+    """Errors found on validation of tags and material index."""
+
+    def __init__(self: ValidationError, report: ValidationReport) -> None:
+        """Create exception with the full validation report.
+
+        Args:
+            report: the found issues
+        """
+        MyError.__init__(self, report.summary())
+        self.report = report
@@ -2,19 +2,27 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, TypeVar
 
+import os
 import re
 
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 
 import numpy as np
 import pandas as pd
 
 _META_PATTERN = re.compile(r"\[(?P<meta>[^]]+)]")
 
+T = TypeVar("T")
+
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Callable, Iterable, Sequence
+    from functools import _CacheInfo
+
+    from mapstp.rules import RulesMatcher
 
 
 @dataclass
@@ -50,38 +58,322 @@ class MetaInfoCollector:
             self.rwcl = t
 
 
-def extract_path_info(paths: list[str], material_index: pd.DataFrame) -> pd.DataFrame:
+def extract_path_info(
+    paths: list[str],
+    material_index: pd.DataFrame,
+    jobs: int | None = 1,
+    *,
+    rules: RulesMatcher | None = None,
+) -> pd.DataFrame:
     """Extract meta information from `paths` and associate corresponding data with each path.
 
+    The mnemonics are collected for all the paths first and resolved
+    against the `material_index` in one pass.
+
     Args:
         paths: STP paths
         material_index: mnemonic-material-density lookup table
+        jobs: number of processes to use, None or 0 - all CPUs, default 1 - no parallelism
+        rules: if provided, the tags from the matching rules are applied before inline tags
 
     Returns:
         Table with material `number`, `density`, applied correction `factor`,
         and `rwcl` label corresponding to every path in paths
     """
-    return pd.DataFrame.from_records(
-        _records(paths, material_index),
-        columns=["material_number", "density", "factor", "rwcl"],
+    return extract_path_meta_info(paths, material_index, jobs, rules=rules).drop(
+        columns="mnemonic",
     )
 
 
-def _records(
+PARALLEL_CHUNK_SIZE = 50_000
+"""Number of paths to pass to a worker process at once."""
+
+
+def extract_path_meta_info(
+    paths: list[str],
+    material_index: pd.DataFrame | None,
+    jobs: int | None = 1,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    *,
+    rules: RulesMatcher | None = None,
+) -> pd.DataFrame:
+    """Extract meta information from `paths` with mnemonics and resolved materials.
+
+    On parallel run the paths are split to chunks processed in a pool of processes.
+    The material index and rules are passed to every worker process once.
+    The results are joined in the order of `paths`, so, the output is
+    the same as on serial run.
+
+    Args:
+        paths: STP paths
+        material_index: mnemonic-material-density lookup table,
+                        if None, the materials are not resolved
+        jobs: number of processes to use, None or 0 - all CPUs, default 1 - no parallelism
+        chunk_size: number of paths to process in a worker at once
+        rules: if provided, the tags from the matching rules are applied before inline tags
+
+    Returns:
+        Table with `mnemonic`, material `number`, `density`, applied correction `factor`,
+        and `rwcl` label corresponding to every path in paths,
+        without `number` and `density`, if `material_index` is not provided
+    """
+    workers = jobs or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= chunk_size:
+        return _extract_path_meta_info(paths, material_index, rules)
+    results = _map_chunks(_extract_chunk, paths, workers, chunk_size, (material_index, rules))
+    return pd.concat(results, ignore_index=True)
+
+
+def collect_path_meta_info(
+    paths: list[str],
+    jobs: int | None = 1,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    *,
+    rules: RulesMatcher | None = None,
+) -> tuple[pd.DataFrame, list[tuple[int, str]]]:
+    """Collect meta information from `paths` with malformed tags instead of raising exception.
+
+    The work is split between processes like in :func:`extract_path_meta_info`.
+
+    Args:
+        paths: STP paths
+        jobs: number of processes to use, None or 0 - all CPUs, default 1 - no parallelism
+        chunk_size: number of paths to process in a worker at once
+        rules: if provided, the tags from the matching rules are applied before inline tags
+
+    Returns:
+        Table like :func:`collect_meta_info` and pairs (row, tag contents) of malformed tags.
+    """
+    workers = jobs or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= chunk_size:
+        malformed: list[tuple[int, str]] = []
+        return collect_meta_info(paths, malformed, rules=rules), malformed
+    results = _map_chunks(_collect_chunk, paths, workers, chunk_size, (None, rules))
+    malformed = [
+        (start + row, meta)
+        for start, (_, chunk_malformed) in zip(
+            range(0, len(paths), chunk_size), results, strict=True
+        )
+        for row, meta in chunk_malformed
+    ]
+    return pd.concat([frame for frame, _ in results], ignore_index=True), malformed
+
+
+def _map_chunks(  # noqa: UP047 - type parameters syntax requires Python 3.12
+    worker: Callable[[list[str]], T],
     paths: list[str],
+    workers: int,
+    chunk_size: int,
+    initargs: tuple[pd.DataFrame | None, RulesMatcher | None],
+) -> list[T]:
+    chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(chunks)),
+        initializer=_init_worker,
+        initargs=initargs,
+    ) as executor:
+        return list(executor.map(worker, chunks))
+
+
+def _extract_path_meta_info(
+    paths: Sequence[str],
+    material_index: pd.DataFrame | None,
+    rules: RulesMatcher | None,
+) -> pd.DataFrame:
+    meta_info = collect_meta_info(paths, rules=rules)
+    if material_index is None:
+        return meta_info
+    return resolve_meta_info(meta_info, material_index, paths)
+
+
+def resolve_meta_info(
+    meta_info: pd.DataFrame,
     material_index: pd.DataFrame,
-) -> Iterator[tuple[int | None, float | None, float | None, str | None]]:
-    for path in paths:
-        meta_info = extract_meta_info_from_path(path)
-        if meta_info.mnemonic:
-            density, material_number = define_material_number_and_density(
-                material_index,
-                meta_info,
-                path,
-            )
+    paths: Sequence[str],
+) -> pd.DataFrame:
+    """Add materials resolved with :func:`resolve_materials` to collected meta information.
+
+    Args:
+        meta_info: table with `mnemonic`, `factor` and `rwcl` for every path
+        material_index: mnemonic-material-density lookup table
+        paths: STP paths corresponding to `meta_info` rows, for diagnostics
+
+    Returns:
+        Table like :func:`extract_path_meta_info` returns.
+    """
+    materials = resolve_materials(meta_info["mnemonic"], material_index, paths)
+    return pd.concat([meta_info[["mnemonic"]], materials, meta_info[["factor", "rwcl"]]], axis=1)
+
+
+_worker_material_index: pd.DataFrame | None = None
+_worker_rules: RulesMatcher | None = None
+
+
+def _init_worker(material_index: pd.DataFrame | None, rules: RulesMatcher | None) -> None:
+    global _worker_material_index, _worker_rules  # noqa: PLW0603
+    _worker_material_index = material_index
+    _worker_rules = rules
+
+
+def _extract_chunk(paths: list[str]) -> pd.DataFrame:
+    return _extract_path_meta_info(paths, _worker_material_index, _worker_rules)
+
+
+def _collect_chunk(paths: list[str]) -> tuple[pd.DataFrame, list[tuple[int, str]]]:
+    malformed: list[tuple[int, str]] = []
+    return collect_meta_info(paths, malformed, rules=_worker_rules), malformed
+
+
+def collect_meta_info(
+    paths: Iterable[str],
+    malformed: list[tuple[int, str]] | None = None,
+    *,
+    rules: RulesMatcher | None = None,
+) -> pd.DataFrame:
+    """Collect meta information from all the `paths`.
+
+    Args:
+        paths: STP paths
+        malformed: if provided, collects pairs (row, tag contents) for tags,
+                   which cannot be parsed, instead of raising exception
+        rules: if provided, the tags from the matching rules are applied before inline tags
+
+    Returns:
+        Table with `mnemonic`, `factor` and `rwcl` for every path in `paths`.
+    """
+    mnemonics: list[str | None] = []
+    factors: list[float] = []
+    rwcls: list[str | None] = []
+    for row, path in enumerate(paths):
+        if malformed is None:
+            meta_info = extract_meta_info_from_path(path, rules=rules)
         else:
-            material_number = density = None
-        yield material_number, density, meta_info.factor, meta_info.rwcl
+            found: list[str] = []
+            meta_info = extract_meta_info_from_path(path, found, rules=rules)
+            malformed.extend((row, meta) for meta in found)
+        # empty mnemonic [m-] means the path is not tagged with material
+        mnemonics.append(meta_info.mnemonic or None)
+        factors.append(np.nan if meta_info.factor is None else meta_info.factor)
+        rwcls.append(meta_info.rwcl)
+    return pd.DataFrame(
+        {
+            "mnemonic": pd.Series(mnemonics, dtype=object),
+            "factor": np.array(factors, dtype=float),
+            "rwcl": pd.Series(rwcls, dtype=object),
+        },
+    )
+
+
+def resolve_materials(
+    mnemonics: pd.Series,
+    material_index: pd.DataFrame,
+    paths: Sequence[str],
+) -> pd.DataFrame:
+    """Define material numbers and densities for all the `mnemonics` at once.
+
+    The mnemonics are converted to categorical values, so, the material index
+    is looked up only once per distinct mnemonic. The values are then
+    spread over the cells with the categorical codes.
+
+    Args:
+        mnemonics: mnemonic for each cell, None for cells without material
+        material_index: table mapping material mnemonics to material number and density
+        paths: STP paths corresponding to `mnemonics`, for diagnostics
+
+    Returns:
+        Table with `material_number` and `density` columns indexed as `mnemonics`.
+
+    Raises:
+        KeyError: if a mnemonic is not specified in the material index.
+        ValueError: if a density is not specified or negative.
+    """
+    return _resolve(pd.Categorical(mnemonics), mnemonics.index, material_index, paths)
+
+
+def resolve_scenarios(
+    mnemonics: pd.Series,
+    material_indexes: Sequence[pd.DataFrame],
+    paths: Sequence[str],
+) -> list[pd.DataFrame]:
+    """Define material numbers and densities for several material indexes.
+
+    The mnemonics are converted to categorical values once for all the indexes.
+
+    Args:
+        mnemonics: mnemonic for each cell, None for cells without material
+        material_indexes: tables mapping material mnemonics to material number and density
+        paths: STP paths corresponding to `mnemonics`, for diagnostics
+
+    Returns:
+        Tables with `material_number` and `density` columns for every index.
+
+    Raises:
+        KeyError: if a mnemonic is not specified in a material index.
+        ValueError: if a density is not specified or negative.
+    """
+    categorical = pd.Categorical(mnemonics)
+    return [_resolve(categorical, mnemonics.index, mi, paths) for mi in material_indexes]
+
+
+def _resolve(
+    categorical: pd.Categorical,
+    index: pd.Index,
+    material_index: pd.DataFrame,
+    paths: Sequence[str],
+) -> pd.DataFrame:
+    codes = categorical.codes
+    categories = categorical.categories
+    lookup = material_index.reindex(categories)
+    numbers = lookup["number"].to_numpy(dtype=float)
+    densities = lookup["density"].to_numpy(dtype=float)
+
+    def _first_path(category: int) -> str:
+        return paths[int(np.flatnonzero(codes == category)[0])]
+
+    missed = np.flatnonzero(np.isnan(numbers))
+    if missed.size:
+        k = missed[0]
+        msg = (
+            f"The mnemonic {categories[k]!r} "
+            "is not specified in the material index. "
+            f"See the STP path: {_first_path(k)}"
+        )
+        raise KeyError(msg)
+    no_density = np.flatnonzero(np.isnan(densities))
+    if no_density.size:
+        k = no_density[0]
+        msg = (
+            f"The density for mnemonic {categories[k]!r} "
+            f"is not specified in the material index{_layer_note(lookup, k)}."
+        )
+        raise ValueError(msg)
+    negative = np.flatnonzero(densities < 0.0)
+    if negative.size:
+        k = negative[0]
+        msg = (
+            f"The density for mnemonic {categories[k]!r} "
+            f"in the material index{_layer_note(lookup, k)} is not to be negative."
+        )
+        raise ValueError(msg)
+
+    defined = codes >= 0
+    material_number = np.full(codes.shape, np.nan)
+    material_number[defined] = numbers[codes[defined]]
+    density = np.full(codes.shape, np.nan)
+    density[defined] = densities[codes[defined]]
+    result = pd.DataFrame(
+        {"material_number": material_number, "density": density},
+        index=index,
+    )
+    if defined.all():
+        result["material_number"] = result["material_number"].astype(int)
+    return result
+
+
+def _layer_note(lookup: pd.DataFrame, k: int) -> str:
+    if "layer" not in lookup.columns:
+        return ""
+    return f" (layer {lookup['layer'].iloc[k]!r})"
 
 
 def define_material_number_and_density(
@@ -124,33 +416,83 @@ def define_material_number_and_density(
     return density, material_number
 
 
-def extract_meta_info_from_path(path: str) -> MetaInfoCollector:
+def extract_meta_info_from_path(
+    path: str,
+    malformed: list[str] | None = None,
+    *,
+    rules: RulesMatcher | None = None,
+) -> MetaInfoCollector:
     """Extract meta information from an STP path.
 
     Args:
         path: ... to body with `[m-...]` tags
+        malformed: if provided, collects contents of tags, which cannot be parsed,
+                   instead of raising exception
+        rules: if provided, the tags from the matching rules are applied before inline tags
 
     Returns:
         Collected meta info map.
     """
     meta_info = MetaInfoCollector()
+    if rules is not None:
+        for pairs in rules.pairs(path):
+            meta_info.update(dict(pairs))
     found = _META_PATTERN.findall(path)
     if found:
         for meta in found:
-            pairs = _extract_meta_info(meta, path)
-            meta_info.update(pairs)
+            if malformed is None:
+                meta_info.update(_extract_meta_info(meta, path))
+            else:
+                try:
+                    meta_info.update(dict(parse_meta(meta)))
+                except ValueError:
+                    malformed.append(meta)
     return meta_info
 
 
 def _extract_meta_info(meta: str, path: str) -> dict[str, str]:
     try:
-        pairs: dict[str, str] = dict(_create_pair(t) for t in meta.split())
+        pairs: dict[str, str] = dict(parse_meta(meta))
     except ValueError as _ex:
         msg = f"On path {path}"
         raise ValueError(msg) from _ex
     return pairs
 
 
+META_CACHE_SIZE = 4096
+"""Maximum number of distinct tags contents kept in the parsing cache."""
+
+
+@lru_cache(maxsize=META_CACHE_SIZE)
+def parse_meta(meta: str) -> tuple[tuple[str, str], ...]:
+    """Split a tag contents to key-value pairs.
+
+    The same tags are repeated over many STP paths,
+    so, the results are cached.
+
+    Args:
+        meta: text inside brackets, like "m-SS316 f-0.9"
+
+    Returns:
+        The key-value pairs.
+    """
+    return tuple(_create_pair(t) for t in meta.split())
+
+
+def meta_cache_info() -> _CacheInfo:
+    """Get statistics of the tags parsing cache.
+
+    Returns:
+        hits, misses, maximum size and current size of the cache
+    """
+    return parse_meta.cache_info()
+
+
+def clear_meta_cache() -> None:
+    """Clear the tags parsing cache and its statistics."""
+    parse_meta.cache_clear()
+
+
 def _create_pair(meta_part: str) -> tuple[str, str]:
     a, b = meta_part.split("-", maxsplit=1)
     return a, b
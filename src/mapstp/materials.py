@@ -7,19 +7,25 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING, TextIO
 
-from collections import defaultdict
-from dataclasses import dataclass, field
+import hashlib
+import re
+
 from logging import getLogger
 from pathlib import Path
 
-import numpy as np
-
-from mapstp.utils._re import CARD_PATTERN, MATERIAL_PATTERN
+from mapstp.materials_library import (
+    ENCODING,
+    LazyMaterials,
+    card_text,
+    load_library_materials,
+    scan_material_spans,
+)
+from mapstp.utils._re import CARD_PATTERN, COMMENT_LINE_PATTERN, MATERIAL_PATTERN
 
 if TYPE_CHECKING:
     import sqlite3 as sq
 
-    from collections.abc import Callable, Generator, Iterable
+    from collections.abc import Callable, Generator, Iterable, Iterator, Mapping, Sequence
 
     import pandas as pd
 
@@ -29,51 +35,17 @@ MaterialsDict = dict[int, str]
 logger = getLogger()
 
 
-@dataclass
-class _Loader:
-    stream: TextIO
-    material_no: int = field(default=-1, init=False)
-    materials_dict: dict[int, list[str]] = field(
-        default_factory=lambda: defaultdict(list),
-        init=False,
-    )
-
-    def __post_init__(self: _Loader) -> None:
-        for line in self.stream:
-            self._process_line(line)
-
-    @property
-    def _in_material_card(self: _Loader) -> bool:
-        return self.material_no > 0
-
-    def _process_line(self: _Loader, line: str) -> None:
-        if self._in_material_card:
-            match = CARD_PATTERN.search(line)
-            if not match:
-                self._append(line)
-                return
-            if match.lastgroup != "comment" and not self._check_if_material_line(line):
-                self.material_no = -1
-        else:
-            self._check_if_material_line(line)
-
-    def _append(self: _Loader, line: str) -> None:
-        if self.material_no > 0:
-            self.materials_dict[self.material_no].append(line)
-
-    def _check_if_material_line(self: _Loader, line: str) -> bool:
-        match = MATERIAL_PATTERN.search(line)
-        if match:
-            self.material_no = int(match["material"])
-            if self.material_no <= 0:
-                msg = f"Wrong material number {self.material_no} found"
-                raise ValueError(msg)
-            if self.material_no in self.materials_dict:
-                msg = f"Material number {self.material_no} is duplicated"
-                raise ValueError(msg)
-            self._append(line)
-            return True
-        return False  # skipping other cards and prepending text
+def load_materials_map_from_bytes(data: bytes) -> MaterialsDict:
+    """Read materials from MCNP text.
+
+    Args:
+        data: MCNP text in cp1251 encoding
+
+    Returns:
+        MaterialsDict: mapping material number -> material text
+    """
+    spans = scan_material_spans(data)
+    return {number: card_text(data[start:stop]) for number, (start, stop) in spans.items()}
 
 
 def load_materials_map_from_stream(stream: TextIO) -> MaterialsDict:
@@ -85,29 +57,37 @@ def load_materials_map_from_stream(stream: TextIO) -> MaterialsDict:
     Returns:
         MaterialsDict: mapping material number -> material text
     """
-    loader = _Loader(stream)
+    text = stream.read()
+    # cp1251 is a single byte encoding, so, the offsets in the encoded text are the same,
+    # the characters not representable in cp1251 are replaced only for the scan
+    spans = scan_material_spans(text.encode(ENCODING, errors="replace"))
+    return {number: _card_text(text[start:stop]) for number, (start, stop) in spans.items()}
 
-    def _restore_material_text(lines: Iterable[str]) -> str:
-        result = "".join(lines)
-        if not result.endswith("\n"):
-            result += "\n"
-        return result
 
-    return {k: _restore_material_text(v) for k, v in loader.materials_dict.items()}
+def _card_text(chunk: str) -> str:
+    # str version of mapstp.materials_library.card_text
+    chunk = chunk.replace("\r\n", "\n")
+    if not chunk.endswith("\n"):
+        chunk += "\n"
+    return COMMENT_LINE_PATTERN.sub("", chunk)
 
 
-def load_materials_map(materials: str | Path) -> MaterialsDict:
+def load_materials_map(materials: str | Path, member: str | None = None) -> MaterialsDict:
     """Read materials from MCNP file.
 
     Args:
-        materials: name of MCNP file, containing materials to read
+        materials: name of MCNP file, containing materials to read,
+                   the file can be compressed: `.zip`, `.gz`, `.xz` or `.bz2`
+        member: name of the file in zip archive, if the archive contains several files
+
+    Note:
+        The parsed materials are cached in :mod:`mapstp.materials_library` index,
+        so, the library is parsed only on the first call or after it is changed.
 
     Returns:
         MaterialsDict: mapping material number -> material text
     """
-    path = Path(materials)
-    with path.open(encoding="cp1251") as stream:
-        return load_materials_map_from_stream(stream)
+    return load_library_materials(Path(materials).resolve(), member)
 
 
 def drop_material_cards(lines: Iterable[str]) -> Generator[str]:
@@ -130,7 +110,7 @@ def drop_material_cards(lines: Iterable[str]) -> Generator[str]:
             yield line
 
 
-def materials_spec_mapper(materials_map: dict[int, str]) -> Callable[[int], str]:
+def materials_spec_mapper(materials_map: Mapping[int, str]) -> Callable[[int], str]:
     """Create method to extract a material specification by its number.
 
     Args:
@@ -161,7 +141,7 @@ def materials_spec_mapper(materials_map: dict[int, str]) -> Callable[[int], str]
     return _func
 
 
-def get_used_materials(materials_map: dict[int, str], path_info: pd.DataFrame) -> str:
+def get_used_materials(materials_map: Mapping[int, str], path_info: pd.DataFrame) -> str:
     """Collect text of used materials specifications.
 
     Args:
@@ -171,20 +151,61 @@ def get_used_materials(materials_map: dict[int, str], path_info: pd.DataFrame) -
     Returns:
         All the used materials specs to be used as part of MCNP model text.
     """
-    values = path_info["material_number"].to_numpy()
-    used_numbers = sorted({int(m) for m in values if not np.isnan(m)})
-    used_materials_texts = list(map(materials_spec_mapper(materials_map), used_numbers))
-    return "".join(used_materials_texts)
+    return "".join(iter_used_materials(materials_map, used_material_numbers(path_info)))
 
 
-def get_used_materials_sql(con: sq.Connection, materials_map: dict[int, str]) -> str:
+def get_used_materials_sql(con: sq.Connection, materials_map: Mapping[int, str]) -> str:
     """Collect text of used materials specifications.
 
     Args:
         con: database connection
         materials_map: map material number -> spec.
     """
-    used_numbers = [
+    return "".join(iter_used_materials(materials_map, used_material_numbers_sql(con)))
+
+
+def iter_used_materials(
+    materials_map: Mapping[int, str],
+    used_numbers: Sequence[int],
+) -> Iterator[str]:
+    """Generate specifications of used materials one by one.
+
+    The specifications are produced on iteration, so, they can be written
+    to output without collecting the whole text.
+    The warnings on the materials missing in `materials_map` are issued on iteration as well.
+
+    Args:
+        materials_map: map material number -> spec.
+        used_numbers: the material numbers in order of output
+
+    Yields:
+        The material specifications.
+    """
+    yield from map(materials_spec_mapper(_read_used(materials_map, used_numbers)), used_numbers)
+
+
+def used_material_numbers(path_info: pd.DataFrame) -> list[int]:
+    """Collect numbers of materials used in cells.
+
+    Args:
+        path_info: dataframe containing column with used material numbers.
+
+    Returns:
+        The sorted numbers.
+    """
+    return sorted(int(m) for m in path_info["material_number"].dropna().unique())
+
+
+def used_material_numbers_sql(con: sq.Connection) -> list[int]:
+    """Collect numbers of materials used in cells from database.
+
+    Args:
+        con: database connection
+
+    Returns:
+        The sorted numbers.
+    """
+    return [
         x[0]
         for x in con.execute(
             """
@@ -195,5 +216,108 @@ def get_used_materials_sql(con: sq.Connection, materials_map: dict[int, str]) ->
             """,
         )
     ]
-    used_materials_texts = list(map(materials_spec_mapper(materials_map), used_numbers))
-    return "".join(used_materials_texts)
+
+
+def composition_hash(text: str) -> str:
+    """Compute hash of normalized composition of a material card.
+
+    The comments and the material number are ignored.
+    The fractions are scaled to the sum of 1, the components and keywords are sorted,
+    so, the cards defining the same material for MCNP get the same hash.
+    The sign of the fractions (atom or weight) is kept in the hash.
+
+    Args:
+        text: material card text
+
+    Returns:
+        Hex digest of the composition.
+    """
+    lines = (line for line in text.split("\n") if not _is_comment(line))
+    body = " ".join(line.split("$", 1)[0] for line in lines)
+    tokens = _KEYWORD_EQUALS.sub("=", body).replace("&", " ").split()[1:]
+    keywords = sorted(t.lower() for t in tokens if "=" in t)
+    components = [t.lower() for t in tokens if "=" not in t]
+    try:
+        fractions = [float(f) for f in components[1::2]]
+    except ValueError:
+        fractions = []
+    if fractions and len(fractions) * 2 == len(components):
+        total = sum(fractions)
+        kind = []
+        if total and all(f * total > 0 for f in fractions):
+            kind = ["weight" if total < 0 else "atom"]
+            fractions = [f / total for f in fractions]
+        pairs = sorted(
+            f"{zaid}:{f:.9e}" for zaid, f in zip(components[::2], fractions, strict=True)
+        )
+        canonical = " ".join(kind + pairs + keywords)
+    else:
+        canonical = " ".join(components + keywords)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def compact_used_materials(
+    materials_map: Mapping[int, str],
+    path_info: pd.DataFrame,
+    *,
+    merge_duplicates: bool = True,
+    renumber: bool = False,
+) -> tuple[pd.DataFrame, Iterator[str]]:
+    """Collect used materials, merging duplicates and renumbering them.
+
+    The used materials with the same :func:`composition_hash` are replaced
+    with the one having the lowest number. The materials not found in `materials_map`
+    are never merged.
+
+    Args:
+        materials_map: map material number -> spec.
+        path_info: dataframe containing column with used material numbers.
+        merge_duplicates: replace materials with the same composition with one of them
+        renumber: number the remaining materials from 1 in order of the original numbers
+
+    Returns:
+        The `path_info` copy with new material numbers and the used materials specs
+        generated like in :func:`iter_used_materials`.
+    """
+    values = path_info["material_number"]
+    used_numbers = used_material_numbers(path_info)
+    materials_map = _read_used(materials_map, used_numbers)
+    canonical: dict[str, int] = {}
+    targets: dict[int, int] = {}
+    for number in used_numbers:
+        text = materials_map.get(number)
+        key = composition_hash(text) if merge_duplicates and text else f"M{number}"
+        targets[number] = canonical.setdefault(key, number)
+    kept = sorted(canonical.values())
+    new_numbers = {n: i for i, n in enumerate(kept, start=1)} if renumber else {n: n for n in kept}
+    if len(kept) < len(used_numbers):
+        logger.info(
+            "Merged %d materials with duplicated compositions", len(used_numbers) - len(kept)
+        )
+    spec = materials_spec_mapper(materials_map)
+    used_materials = (_renumber_card(spec(n), new_numbers[n]) for n in kept)
+    result = path_info.copy()
+    result["material_number"] = values.map({n: new_numbers[t] for n, t in targets.items()})
+    return result, used_materials
+
+
+_KEYWORD_EQUALS = re.compile(r"\s*=\s*")
+
+
+def _is_comment(line: str) -> bool:
+    match = CARD_PATTERN.search(line)
+    return match is not None and match.lastgroup == "comment"
+
+
+def _renumber_card(text: str, number: int) -> str:
+    match = MATERIAL_PATTERN.search(text)
+    if match is None:
+        return text
+    return text[: match.start("material")] + str(number) + text[match.end("material") :]
+
+
+def _read_used(materials_map: Mapping[int, str], used_numbers: Sequence[int]) -> Mapping[int, str]:
+    # read a library in one pass instead of opening it for every material
+    if isinstance(materials_map, LazyMaterials):
+        return materials_map.read(used_numbers)
+    return materials_map
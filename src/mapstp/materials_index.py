@@ -1,23 +1,76 @@
-"""Code to load materials index."""
+"""Code to load materials index.
+
+The index can be stored in Excel, CSV, TSV, SQLite, JSON or TOML file,
+the format is selected by the file extension. The text and SQLite formats are read
+directly into the index rows.
+
+Reading Excel is slow, so, the loaded index is cached in SQLite database
+in :func:`mapstp.utils.cache_dir` and reloaded from there,
+while the Excel file size and modification time are not changed.
+
+The default index is edited in Excel file :data:`DEFAULT_INDEX_SOURCE`, but is shipped
+and loaded as TSV file :data:`DEFAULT_INDEX` compiled from it with :func:`compile_materials_index`
+(see `tools/compile-default-index`). It is loaded only on the first request.
+"""
 
 from __future__ import annotations
 
-from typing import cast
+from typing import TYPE_CHECKING, Any, cast
 
+import csv
+import json
+import sqlite3 as sq
+import tomllib
+
+from contextlib import closing
+from functools import cache, partial
 from importlib.resources import files
+from logging import getLogger
 from pathlib import Path
 
 import pandas as pd
 
+from mapstp.utils import cache_dir, file_signature
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+
+    from mapstp.utils import FileSignature
+
 PACKAGE_DATA: Path = cast("Path", files("mapstp").joinpath("data"))
 
+DEFAULT_INDEX_SOURCE: Path = PACKAGE_DATA / "default-material-index.xlsx"
+"""Editable source of the default materials index."""
+
+DEFAULT_INDEX: Path = PACKAGE_DATA / "default-material-index.tsv"
+"""The default materials index compiled from :data:`DEFAULT_INDEX_SOURCE`."""
+
+INDEX_CACHE_FILE_NAME = "materials-index-cache.sqlite"
+"""Name of the database with loaded materials indexes in the cache directory."""
+
+logger = getLogger()
 
-def load_materials_index(materials_index: str | None = None) -> pd.DataFrame:
-    """Load material index from file.
+
+def load_materials_index(
+    materials_index: str | Sequence[str | None] | None = None,
+) -> pd.DataFrame:
+    """Load material index from file or several files.
+
+    If a sequence of files is given, the indexes are merged with
+    :func:`merge_materials_indexes` in the given order, the later override the earlier.
+
+    The columns in all the formats are: mnemonic, number, and density
+    named either "eff.density, g/cm3" (like in Excel) or "density".
+
+    - `.csv`, `.tsv` - the first line is the header
+    - `.sqlite`, `.sqlite3`, `.db` - table `materials_index`
+    - `.json` - list of objects, or object with such a list in the "materials" field
+    - `.toml` - array of tables "materials"
+    - other extensions - Excel
 
     Args:
-        materials_index: file name of index to load,
-                         if not provided, uses data/default-material-index.xlsx
+        materials_index: file name of index to load, or sequence of such names,
+                         if not provided, uses :func:`default_materials_index`
 
     Note:
         Validation of material index input values is postponed to usage of defined mnemonics.
@@ -30,19 +83,283 @@ def load_materials_index(materials_index: str | None = None) -> pd.DataFrame:
 
     Raises:
         FileNotFoundError: if the file `materials_index` doesn't exist.
+        ValueError: if the required columns are missing in non Excel file.
     """
+    if materials_index is not None and not isinstance(materials_index, str):
+        return merge_materials_indexes(
+            [(name or "default", load_materials_index(name)) for name in materials_index],
+        )
     if materials_index is None:
-        p = PACKAGE_DATA / "default-material-index.xlsx"
-    else:
-        p = Path(materials_index)
+        return default_materials_index().copy()
+    p = Path(materials_index)
     if not p.exists():
         raise FileNotFoundError(p)
+    p = p.resolve()
+    reader = _ROW_READERS.get(p.suffix.lower())
+    if reader is not None:
+        return _from_rows(reader(p))
+    signature = file_signature(p)
+    try:
+        con = sq.connect(cache_dir() / INDEX_CACHE_FILE_NAME, timeout=60.0)
+    except (sq.Error, OSError) as ex:
+        logger.warning("Cannot use materials index cache: %s", ex)
+        return _read_excel(p)
+    with closing(con), con:
+        _create_cache_tables(con)
+        materials = _select_cached(con, str(p), signature)
+        if materials is None:
+            materials = _read_excel(p)
+            _store_cached(con, str(p), signature, materials)
+        return materials
+
+
+@cache
+def default_materials_index() -> pd.DataFrame:
+    """Load the default materials index compiled to package data.
+
+    The index is loaded on the first call and shared by the subsequent ones,
+    so, it should not be modified, :func:`load_materials_index` returns a copy.
+
+    Returns:
+        The default index.
+    """
+    logger.debug("Loading default materials index from %s", DEFAULT_INDEX)
+    return _from_rows(_read_csv(DEFAULT_INDEX, delimiter="\t"))
+
+
+def empty_materials_index() -> pd.DataFrame:
+    """Create materials index without materials.
+
+    Used instead of the default index, when no mnemonics are to be resolved.
+
+    Returns:
+        The index with the same columns as :func:`load_materials_index` returns.
+    """
+    return _from_rows([])
+
+
+def compile_materials_index(source: Path, target: Path) -> None:
+    """Compile materials index from any supported format to TSV file.
+
+    The TSV file is fast to load and is used to ship the default index,
+    compiled from its Excel source.
+
+    Args:
+        source: the index to compile
+        target: the TSV file to write
+    """
+    materials = load_materials_index(str(source))
+    with target.open("w", newline="", encoding="utf-8") as stream:
+        writer = csv.writer(stream, delimiter="\t", lineterminator="\n")
+        writer.writerow(("mnemonic", "number", "density"))
+        writer.writerows(
+            (
+                mnemonic,
+                "" if pd.isna(number) else int(number),
+                "" if pd.isna(density) else repr(float(density)),
+            )
+            for mnemonic, number, density in zip(
+                materials.index,
+                materials["number"],
+                materials["density"],
+                strict=True,
+            )
+        )
+
+
+def merge_materials_indexes(layers: Sequence[tuple[str, pd.DataFrame]]) -> pd.DataFrame:
+    """Merge material indexes into one, the later layers override the earlier ones.
+
+    The result is the same lookup table as a single index with additional
+    categorical column `layer`, the name of the layer, where a mnemonic is defined.
+    A row is dropped only if a later layer defines the same mnemonic,
+    the duplicates inside a layer are kept to be reported on validation.
+
+    Args:
+        layers: pairs of a layer name and its index in the order of overriding
+
+    Returns:
+        The merged index.
+
+    Raises:
+        ValueError: if `layers` is empty.
+    """
+    if not layers:
+        msg = "At least one material index is required"
+        raise ValueError(msg)
+    frames = []
+    defined_later = pd.Index([])
+    for name, index in reversed(layers):
+        overridden = index.index.isin(defined_later)
+        frames.append(index.loc[~overridden, ["number", "density"]].assign(layer=name))
+        defined_later = defined_later.append(index.index)
+    merged = pd.concat(reversed(frames))
+    merged["layer"] = merged["layer"].astype("category")
+    return merged
+
+
+def _read_excel(path: Path) -> pd.DataFrame:
     materials = pd.read_excel(
-        p,
+        path,
         usecols=["mnemonic", "number", "eff.density, g/cm3"],
-        converters={"number": int, "eff.density, g/cm3": float},
+        # numeric mnemonics are read as strings like from the other formats and the cache
+        converters={"mnemonic": str, "number": int, "eff.density, g/cm3": float},
         engine="openpyxl",
     )
     materials = materials.loc[materials["mnemonic"].notna()]
     materials = materials.rename(columns={"eff.density, g/cm3": "density"})
+    materials["density"] = materials["density"].astype(float)
     return materials.set_index(keys="mnemonic")
+
+
+def _create_cache_tables(con: sq.Connection) -> None:
+    con.executescript(
+        """
+        create table if not exists indexes (
+            path text primary key,
+            size integer,
+            mtime_ns integer
+        );
+        create table if not exists index_rows (
+            path text,
+            position integer,
+            mnemonic text,
+            number integer,
+            density real,
+            primary key (path, position)
+        ) without rowid;
+        """,
+    )
+
+
+def _select_cached(con: sq.Connection, path: str, signature: FileSignature) -> pd.DataFrame | None:
+    row = con.execute("select size, mtime_ns from indexes where path = ?", (path,)).fetchone()
+    if row is None or tuple(row) != signature:
+        return None
+    rows = con.execute(
+        "select mnemonic, number, density from index_rows where path = ? order by position",
+        (path,),
+    )
+    return _from_rows(rows)
+
+
+def _store_cached(
+    con: sq.Connection,
+    path: str,
+    signature: FileSignature,
+    materials: pd.DataFrame,
+) -> None:
+    con.execute("delete from index_rows where path = ?", (path,))
+    con.execute(
+        "insert or replace into indexes (path, size, mtime_ns) values (?, ?, ?)",
+        (path, *signature),
+    )
+    con.executemany(
+        "insert into index_rows (path, position, mnemonic, number, density) values (?, ?, ?, ?, ?)",
+        (
+            (path, position, mnemonic, None if pd.isna(number) else int(number), density)
+            for position, (mnemonic, number, density) in enumerate(
+                zip(materials.index, materials["number"], materials["density"], strict=True),
+            )
+        ),
+    )
+
+
+IndexRow = tuple[str | None, int | None, float | None]
+"""Mnemonic, material number and density, the rows without mnemonic are skipped."""
+
+DENSITY_COLUMNS = ("eff.density, g/cm3", "density")
+"""Accepted names of density column."""
+
+
+def _from_rows(rows: Iterable[IndexRow]) -> pd.DataFrame:
+    mnemonics: list[str] = []
+    numbers: list[int | None] = []
+    densities: list[float | None] = []
+    for mnemonic, number, density in rows:
+        if mnemonic:
+            mnemonics.append(mnemonic)
+            numbers.append(number)
+            densities.append(density)
+    number_column = pd.Series(numbers, dtype=float if None in numbers else int)
+    return pd.DataFrame(
+        {"number": number_column, "density": pd.Series(densities, dtype=float)},
+    ).set_axis(pd.Index(mnemonics, name="mnemonic"))
+
+
+def _read_records(records: Iterable[Mapping[str, Any]], path: Path) -> Iterator[IndexRow]:
+    density_column = None
+    for record in records:
+        if density_column is None:
+            density_column = _density_column(record.keys(), path)
+        yield (
+            record.get("mnemonic"),
+            _to_int(record.get("number")),
+            _to_float(record.get(density_column)),
+        )
+
+
+def _density_column(columns: Iterable[str], path: Path) -> str:
+    columns = set(columns)
+    if "mnemonic" not in columns or "number" not in columns:
+        msg = f"The columns 'mnemonic' and 'number' are required in materials index {path}"
+        raise ValueError(msg)
+    for column in DENSITY_COLUMNS:
+        if column in columns:
+            return column
+    msg = (
+        f"Density column is not found in materials index {path}, expected one of {DENSITY_COLUMNS}"
+    )
+    raise ValueError(msg)
+
+
+def _to_int(value: str | float | None) -> int | None:
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, int) else int(float(value))
+
+
+def _to_float(value: str | float | None) -> float | None:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def _read_csv(path: Path, delimiter: str = ",") -> Iterator[IndexRow]:
+    with path.open(newline="", encoding="utf-8-sig") as stream:
+        yield from _read_records(csv.DictReader(stream, delimiter=delimiter), path)
+
+
+def _read_sqlite(path: Path) -> Iterator[IndexRow]:
+    with closing(sq.connect(f"{path.as_uri()}?mode=ro", uri=True)) as con:
+        columns = [row[1] for row in con.execute("pragma table_info(materials_index)")]
+        if not columns:
+            msg = f"Table 'materials_index' is not found in {path}"
+            raise ValueError(msg)
+        density_column = _density_column(columns, path)
+        yield from con.execute(
+            f'select mnemonic, number, "{density_column}" from materials_index',  # noqa: S608
+        )
+
+
+def _read_json(path: Path) -> Iterator[IndexRow]:
+    with path.open(encoding="utf-8") as stream:
+        data = json.load(stream)
+    yield from _read_records(data["materials"] if isinstance(data, dict) else data, path)
+
+
+def _read_toml(path: Path) -> Iterator[IndexRow]:
+    with path.open("rb") as stream:
+        data = tomllib.load(stream)
+    yield from _read_records(data["materials"], path)
+
+
+_ROW_READERS: dict[str, Callable[[Path], Iterator[IndexRow]]] = {
+    ".csv": _read_csv,
+    ".tsv": partial(_read_csv, delimiter="\t"),
+    ".sqlite": _read_sqlite,
+    ".sqlite3": _read_sqlite,
+    ".db": _read_sqlite,
+    ".json": _read_json,
+    ".toml": _read_toml,
+}
@@ -0,0 +1,351 @@
+"""Random access to materials in a large MCNP materials library.
+
+A model uses only a few materials from a library. The library is scanned once
+and the byte ranges and texts of the material cards are stored in a persistent index.
+On the following runs only the cards actually used are read from the library,
+or all the texts are loaded from the index without parsing.
+The index is rebuilt automatically, when the library size or modification time changes.
+
+A library can be compressed (`.zip`, `.gz`, `.xz` or `.bz2`).
+The offsets then refer to the decompressed text. The used cards are read
+in order of their offsets, so, the library is decompressed only up to the last
+of them.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+import sqlite3 as sq
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import closing
+from logging import getLogger
+from pathlib import Path
+
+from mapstp.utils import cache_dir, file_signature, open_binary
+from mapstp.utils._re import COMMENT_LINE_BYTES_PATTERN, MATERIALS_CARD_START_PATTERN
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from mapstp.utils import FileSignature
+
+MaterialSpans = dict[int, tuple[int, int]]
+"""Mapping material number -> (start, stop) byte offsets of its card in a library."""
+
+INDEX_FILE_NAME = "materials-library-index.sqlite"
+"""Name of the persistent index database in the cache directory."""
+
+ENCODING = "cp1251"
+"""Encoding of MCNP materials libraries."""
+
+CARD_CACHE_SIZE = 128
+"""Default number of material cards texts kept in memory by :class:`LazyMaterials`."""
+
+logger = getLogger()
+
+
+def scan_material_spans(data: bytes) -> MaterialSpans:
+    """Find byte ranges of material cards in a materials library.
+
+    A range starts at the material card first line and ends at the start
+    of the next card. The comments following the card are included in the range,
+    they are dropped on reading the card with :func:`card_text`.
+
+    Args:
+        data: the library text in cp1251 encoding
+
+    Returns:
+        The ranges of all the materials.
+
+    Raises:
+        ValueError: if a material number is not positive or duplicated.
+    """
+    spans: MaterialSpans = {}
+    material_no = start = 0
+    # the offsets in data are the ones of new line characters preceding the cards in this text
+    for match in MATERIALS_CARD_START_PATTERN.finditer(b"\n" + data):
+        position = match.start()
+        if material_no:
+            spans[material_no] = (start, position)
+            material_no = 0
+        number = match["material"]
+        if number is not None:
+            material_no = int(number)
+            if material_no <= 0:
+                msg = f"Wrong material number {material_no} found"
+                raise ValueError(msg)
+            if material_no in spans:
+                msg = f"Material number {material_no} is duplicated"
+                raise ValueError(msg)
+            start = position
+    if material_no:
+        spans[material_no] = (start, len(data))
+    return spans
+
+
+def card_text(chunk: bytes) -> str:
+    """Restore material card text from its byte range in a library.
+
+    The comment lines inside the card are dropped.
+
+    Args:
+        chunk: bytes of the card range starting with the material card first line
+
+    Returns:
+        The card text ending with a new line.
+    """
+    chunk = chunk.replace(b"\r\n", b"\n")
+    if not chunk.endswith(b"\n"):
+        chunk += b"\n"
+    # a comment is removed with the preceding new line, its own one ends the previous line
+    return COMMENT_LINE_BYTES_PATTERN.sub(b"", chunk).decode(ENCODING)
+
+
+class LazyMaterials(Mapping[int, str], ABC):
+    """Map material number -> card text, the texts are built on access.
+
+    Only the byte ranges of the cards are kept in memory.
+    The recently used texts are kept in LRU cache.
+    The subclasses define where the bytes are read from.
+    """
+
+    def __init__(
+        self: LazyMaterials, spans: MaterialSpans, cache_size: int = CARD_CACHE_SIZE
+    ) -> None:
+        """Create the map.
+
+        Args:
+            spans: byte ranges of the cards
+            cache_size: number of cards to cache, 0 - don't cache
+        """
+        self.spans = spans
+        self.cache_size = cache_size
+        self._cache: OrderedDict[int, str] = OrderedDict()
+
+    def __getitem__(self: LazyMaterials, number: int) -> str:
+        """Get a material card text.
+
+        Args:
+            number: material number
+
+        Returns:
+            The material card text.
+
+        Raises:
+            KeyError: if the material is not available.
+        """
+        text = self.read([number]).get(number)
+        if text is None:
+            raise KeyError(number)
+        return text
+
+    def __iter__(self: LazyMaterials) -> Iterator[int]:
+        """Iterate over material numbers.
+
+        Returns:
+            Iterator over the numbers.
+        """
+        return iter(self.spans)
+
+    def __len__(self: LazyMaterials) -> int:
+        """Count materials.
+
+        Returns:
+            Number of materials.
+        """
+        return len(self.spans)
+
+    @property
+    def cached_numbers(self: LazyMaterials) -> list[int]:
+        """Material numbers with cached texts, the least recently used first."""
+        return list(self._cache)
+
+    def read(self: LazyMaterials, numbers: Iterable[int]) -> dict[int, str]:
+        """Get several material cards at once.
+
+        The cards missing in the cache are read in the order of their positions.
+
+        Args:
+            numbers: material numbers, not present ones are skipped
+
+        Returns:
+            Map: material number -> card text.
+        """
+        result = {}
+        missing = []
+        for number in set(numbers):
+            if number in self._cache:
+                self._cache.move_to_end(number)
+                result[number] = self._cache[number]
+            elif number in self.spans:
+                missing.append((self.spans[number], number))
+        missing.sort()
+        chunks = self._read_chunks([span for span, _ in missing])
+        for (_, number), chunk in zip(missing, chunks, strict=True):
+            result[number] = text = card_text(chunk)
+            self._remember(number, text)
+        return result
+
+    @abstractmethod
+    def _read_chunks(self: LazyMaterials, spans: list[tuple[int, int]]) -> Iterable[bytes]:
+        """Read the bytes of the cards in the given ranges in the same order."""
+
+    def _remember(self: LazyMaterials, number: int, text: str) -> None:
+        if self.cache_size > 0:
+            self._cache[number] = text
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+class MaterialsText(LazyMaterials):
+    """Materials text in memory with lazy building of material cards."""
+
+    def __init__(self: MaterialsText, data: bytes, cache_size: int = CARD_CACHE_SIZE) -> None:
+        """Scan the text for material cards.
+
+        Args:
+            data: MCNP text in cp1251 encoding
+            cache_size: number of cards to cache, 0 - don't cache
+        """
+        super().__init__(scan_material_spans(data), cache_size)
+        self.data = data
+
+    def _read_chunks(self: MaterialsText, spans: list[tuple[int, int]]) -> Iterable[bytes]:
+        return [self.data[start:stop] for start, stop in spans]
+
+
+class MaterialsLibrary(LazyMaterials):
+    """Materials library file with lazy access to material cards by number."""
+
+    def __init__(
+        self: MaterialsLibrary,
+        path: str | Path,
+        member: str | None = None,
+        cache_size: int = CARD_CACHE_SIZE,
+    ) -> None:
+        """Open a library, build or load its index.
+
+        Args:
+            path: materials library file, plain text or compressed
+            member: name of the library file in zip archive
+            cache_size: number of cards to cache, 0 - don't cache
+        """
+        self.path = Path(path).resolve()
+        self.member = member
+        super().__init__(load_library_spans(self.path, member), cache_size)
+
+    def _read_chunks(self: MaterialsLibrary, spans: list[tuple[int, int]]) -> Iterable[bytes]:
+        if not spans:
+            return []
+        with open_binary(self.path, self.member) as stream:
+            chunks = []
+            for start, stop in spans:
+                stream.seek(start)
+                chunks.append(stream.read(stop - start))
+            return chunks
+
+
+def load_library_spans(path: Path, member: str | None = None) -> MaterialSpans:
+    """Load byte ranges of material cards from the persistent index.
+
+    Scans the library and updates the index, if the library is changed.
+
+    Args:
+        path: resolved path to materials library file
+        member: name of the library file in zip archive
+
+    Returns:
+        The ranges of all the materials in the library.
+    """
+    rows = _load_index(path, member, "select number, start, stop")
+    return {number: (start, stop) for number, start, stop in rows}
+
+
+def load_library_materials(path: Path, member: str | None = None) -> dict[int, str]:
+    """Load texts of all the material cards from the persistent index.
+
+    The texts are parsed and stored together with the byte ranges,
+    so, the following calls don't parse the library.
+
+    Args:
+        path: resolved path to materials library file
+        member: name of the library file in zip archive
+
+    Returns:
+        Map: material number -> card text, in the order of the library.
+    """
+    return dict(_load_index(path, member, "select number, text"))
+
+
+def _load_index(path: Path, member: str | None, select: str) -> list[tuple[Any, ...]]:
+    signature = file_signature(path)
+    library = str(path) if member is None else f"{path}!{member}"
+    query = f"{select} from library_materials where library = ? order by start"
+    try:
+        con = _connect_index(cache_dir() / INDEX_FILE_NAME)
+    except (sq.Error, OSError) as ex:
+        # still use the same code, but the index is lost on exit
+        logger.warning("Cannot use materials library index: %s", ex)
+        con = _connect_index(":memory:")
+    with closing(con), con:
+        row = con.execute(
+            "select size, mtime_ns from libraries where library = ?",
+            (library,),
+        ).fetchone()
+        if row is None or tuple(row) != signature:
+            _store_index(con, library, signature, _scan(path, member))
+        return con.execute(query, (library,)).fetchall()
+
+
+def _scan(path: Path, member: str | None) -> list[tuple[int, int, int, str]]:
+    logger.info("Indexing materials library %s", path)
+    with open_binary(path, member) as stream:
+        data = stream.read()
+    spans = scan_material_spans(data)
+    return [
+        (number, start, stop, card_text(data[start:stop]))
+        for number, (start, stop) in spans.items()
+    ]
+
+
+def _connect_index(database: str | Path) -> sq.Connection:
+    con = sq.connect(database, timeout=60.0)
+    con.executescript(
+        """
+        create table if not exists libraries (
+            library text primary key,
+            size integer,
+            mtime_ns integer
+        );
+        create table if not exists library_materials (
+            library text,
+            number integer,
+            start integer,
+            stop integer,
+            text text,
+            primary key (library, number)
+        ) without rowid;
+        """,
+    )
+    return con
+
+
+def _store_index(
+    con: sq.Connection,
+    library: str,
+    signature: FileSignature,
+    rows: list[tuple[int, int, int, str]],
+) -> None:
+    con.execute("delete from library_materials where library = ?", (library,))
+    con.execute(
+        "insert or replace into libraries (library, size, mtime_ns) values (?, ?, ?)",
+        (library, *signature),
+    )
+    con.executemany(
+        "insert into library_materials (library, number, start, stop, text) values (?, ?, ?, ?, ?)",
+        ((library, *row) for row in rows),
+    )
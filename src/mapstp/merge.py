@@ -18,7 +18,7 @@ import pandas as pd
 
 from mapstp.exceptions import PathInfoError
 from mapstp.materials import drop_material_cards
-from mapstp.utils import CELL_START_PATTERN, read_mcnp_sections
+from mapstp.utils import CELL_START_PATTERN, MCNPSections, read_mcnp_sections
 
 if TYPE_CHECKING:
     import re
@@ -26,8 +26,6 @@ if TYPE_CHECKING:
     from collections.abc import Generator, Iterable, Iterator
     from pathlib import Path
 
-    from mapstp.utils import MCNPSections
-
 logger = getLogger()
 
 
@@ -174,8 +172,8 @@ def _merge_lines(
 def merge_paths(
     output: TextIO,
     path_info: pd.DataFrame,
-    mcnp: Path,
-    used_materials_text: str | None = None,
+    mcnp: Path | MCNPSections,
+    used_materials: str | Iterable[str] | None = None,
 ) -> None:
     """Print to `output` the updated MCNP code.
 
@@ -186,10 +184,11 @@ def merge_paths(
         output: stream to print to
         path_info: table with other information on cells:
                   material number, density, density correction factor.
-        mcnp:   The input MCNP file name.
-        used_materials_text: The specification of materials to add to model.
+        mcnp:   The input MCNP file name or its already loaded sections.
+        used_materials: The specification of materials to add to model,
+                        either the whole text or the cards to be written one by one.
     """
-    mcnp_sections = read_mcnp_sections(mcnp)
+    mcnp_sections = mcnp if isinstance(mcnp, MCNPSections) else read_mcnp_sections(mcnp)
     cells = mcnp_sections.cells
     lines = cells.split("\n")
 
@@ -198,13 +197,32 @@ def merge_paths(
 
     print(file=output)
 
-    _print_other_sections(mcnp_sections, output, used_materials_text)
+    _print_other_sections(mcnp_sections, output, used_materials)
+
+
+def find_cells_with_materials(mcnp: Path | MCNPSections) -> list[int]:
+    """Find the cells having material set in MCNP model.
+
+    Such cells are not changed on merging: their material numbers are kept as is.
+
+    Args:
+        mcnp: The input MCNP file name or its already loaded sections.
+
+    Returns:
+        The numbers of the cells with not zero material.
+    """
+    mcnp_sections = mcnp if isinstance(mcnp, MCNPSections) else read_mcnp_sections(mcnp)
+    return [
+        int(match["number"])
+        for line in mcnp_sections.cells.split("\n")
+        if (match := CELL_START_PATTERN.match(line)) and int(match["material"])
+    ]
 
 
 def _print_other_sections(
     mcnp_sections: MCNPSections,
     output: TextIO,
-    used_materials_text: str | None,
+    used_materials: str | Iterable[str] | None,
 ) -> None:
     surfaces = mcnp_sections.surfaces
     if surfaces:
@@ -218,10 +236,13 @@ def _print_other_sections(
                 cards,
                 remainder,
                 output,
-                used_materials_text,
+                used_materials,
             )
+        elif used_materials is None or isinstance(used_materials, str):
+            print(used_materials, file=output)
         else:
-            print(used_materials_text, file=output)
+            output.writelines(used_materials)
+            print(file=output)
     else:
         logger.warning(
             "There are no surfaces in model, skipping surfaces and data cards including materials",
@@ -232,11 +253,10 @@ def _print_control_cards_with_used_materials(
     cards: str,
     remainder: str | None,
     output: TextIO,
-    used_materials_text: str | None,
+    used_materials: str | Iterable[str] | None,
 ) -> None:
-    if used_materials_text:
-        used_materials_text = used_materials_text.strip()
-        print(used_materials_text, file=output)
+    if _print_stripped(used_materials, output):
+        print(file=output)
         cards_lines = cards.strip().split("\n")
         for line in drop_material_cards(cards_lines):
             print(line, file=output)
@@ -245,3 +265,27 @@ def _print_control_cards_with_used_materials(
     print("\n\n", file=output)
     if remainder:
         print(remainder, file=output, end="")
+
+
+def _print_stripped(chunks: str | Iterable[str] | None, output: TextIO) -> bool:
+    """Print text chunks one by one as if their concatenation is stripped.
+
+    Returns:
+        False, if there's nothing to print.
+    """
+    if chunks is None:
+        return False
+    if isinstance(chunks, str):
+        chunks = [chunks]
+    started = False
+    pending = ""
+    for chunk in chunks:
+        text = chunk if started else chunk.lstrip()
+        body = text.rstrip()
+        if body:
+            output.write(pending + body)
+            pending = text[len(body) :]
+            started = True
+        elif started:
+            pending += text
+    return started
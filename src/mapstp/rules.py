@@ -0,0 +1,299 @@
+"""Assign tags to STP paths with rules from an external file.
+
+A rules file lists path patterns with tags in the same format as in
+the component names::
+
+    # comment
+    Shield block            [m-SS316 f-0.9]
+    */Blanket*/bolt*        [m-Inconel718 r-BLT]
+
+A pattern without ``*`` matches any path containing it as a substring.
+A pattern with ``*`` is a glob, which should match the whole path,
+``*`` matches any sequence of characters including ``/``.
+
+The rules matching a path are applied in the order of the file, so, later rules
+override the values set by the previous ones. The tags found in the path itself
+are applied after the rules, that is, inline tags always take precedence over rules
+in the same way, as tags on lower levels of STP tree override upper ones.
+
+All the patterns are compiled to automatons: tries for anchored prefixes and suffixes
+and an Aho-Corasick automaton for the other literal fragments of the patterns.
+So, every path is matched in time linear in its length, not depending on number of rules.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import re
+
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from mapstp.exceptions import RulesFileError
+from mapstp.extract_info import parse_meta
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+
+_RULE_PATTERN = re.compile(r"^(?P<pattern>.+?)\s*\[(?P<meta>[^]]+)]\s*$")
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A path pattern with tags to assign."""
+
+    pattern: str
+    pairs: tuple[tuple[str, str], ...]
+
+    @property
+    def is_glob(self: Rule) -> bool:
+        """Check if the pattern should match the whole path.
+
+        Returns:
+            True, if the pattern contains '*'
+        """
+        return "*" in self.pattern
+
+
+def parse_rules(lines: Iterable[str]) -> list[Rule]:
+    """Parse rules from lines of a rules file.
+
+    Empty lines and lines starting with '#' are skipped.
+
+    Args:
+        lines: text of rules file
+
+    Returns:
+        The rules in the order of the file.
+
+    Raises:
+        RulesFileError: if a line is not a valid rule or a factor is not a number.
+    """
+    rules = []
+    for number, line in enumerate(lines, start=1):
+        text = line.strip()
+        if not text or text.startswith("#"):
+            continue
+        match = _RULE_PATTERN.match(text)
+        if not match:
+            msg = f"Line {number}: expected '<pattern> [<tags>]', got {text!r}"
+            raise RulesFileError(msg)
+        try:
+            pairs = parse_meta(match["meta"])
+        except ValueError:
+            msg = f"Line {number}: malformed tags [{match['meta']}]"
+            raise RulesFileError(msg) from None
+        for key, value in pairs:
+            if key == "f":
+                try:
+                    float(value)
+                except ValueError:
+                    msg = f"Line {number}: invalid factor f-{value}, expected a number"
+                    raise RulesFileError(msg) from None
+        rules.append(Rule(match["pattern"], pairs))
+    return rules
+
+
+def load_rules(rules_file: str | Path) -> RulesMatcher:
+    """Load and compile rules from a file.
+
+    Args:
+        rules_file: path to the rules file
+
+    Returns:
+        The compiled rules.
+    """
+    with Path(rules_file).open(encoding="utf8") as stream:
+        return RulesMatcher(parse_rules(stream))
+
+
+@dataclass
+class _Trie:
+    goto: list[dict[str, int]] = field(default_factory=lambda: [{}])
+    terminals: dict[int, list[int]] = field(default_factory=dict)
+
+    def add(self: _Trie, word: str, value: int) -> int:
+        node = 0
+        for ch in word:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.goto[node][ch] = nxt
+            node = nxt
+        self.terminals.setdefault(node, []).append(value)
+        return node
+
+    def walk(self: _Trie, text: Iterable[str]) -> Iterator[tuple[int, list[int]]]:
+        """Yield (depth, values) for all the words being prefixes of the `text`."""
+        node = 0
+        depth = 0
+        values = self.terminals.get(node)
+        if values:
+            yield depth, values
+        for ch in text:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                return
+            node = nxt
+            depth += 1
+            values = self.terminals.get(node)
+            if values:
+                yield depth, values
+
+
+@dataclass
+class _AhoCorasick(_Trie):
+    fail: list[int] = field(default_factory=list)
+    out: list[list[int]] = field(default_factory=list)
+
+    def compile(self: _AhoCorasick) -> None:
+        size = len(self.goto)
+        self.fail = [0] * size
+        self.out = [self.terminals.get(node, []) for node in range(size)]
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                candidate = self.goto[f].get(ch, 0)
+                self.fail[nxt] = candidate if candidate != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def search(self: _AhoCorasick, text: str) -> Iterator[tuple[int, int]]:
+        """Yield (end position, keyword) for all the keywords occurrences ordered by end."""
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        node = 0
+        for i, ch in enumerate(text, start=1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for keyword in out[node]:
+                yield i, keyword
+
+
+class RulesMatcher:
+    """Rules compiled to automatons for matching paths."""
+
+    def __init__(self: RulesMatcher, rules: Sequence[Rule]) -> None:
+        """Compile the rules.
+
+        Args:
+            rules: the rules in the order of priority, the later ones override
+        """
+        self.rules = list(rules)
+        self._prefixes = _Trie()
+        self._suffixes = _Trie()
+        self._fragments = _AhoCorasick()
+        self._keywords: dict[str, int] = {}
+        self._keyword_lengths: list[int] = []
+        self._keyword_users: list[list[tuple[int, int]]] = []
+        self._middle_size: list[int] = []
+        self._prefix_size: list[int] = []
+        self._suffix_size: list[int] = []
+        self._always: list[int] = []
+        for i, rule in enumerate(self.rules):
+            self._compile_rule(i, rule)
+        self._fragments.compile()
+
+    def _compile_rule(self: RulesMatcher, i: int, rule: Rule) -> None:
+        if rule.is_glob:
+            parts = rule.pattern.split("*")
+            prefix, *middle, suffix = parts
+        else:
+            prefix, middle, suffix = "", [rule.pattern], ""
+        middle = [m for m in middle if m]
+        self._prefix_size.append(len(prefix) if prefix else -1)
+        self._suffix_size.append(len(suffix) if suffix else -1)
+        self._middle_size.append(len(middle))
+        if prefix:
+            self._prefixes.add(prefix, i)
+        if suffix:
+            self._suffixes.add(suffix[::-1], i)
+        for k, fragment in enumerate(middle):
+            keyword = self._keywords.get(fragment)
+            if keyword is None:
+                keyword = len(self._keyword_lengths)
+                self._keywords[fragment] = keyword
+                self._keyword_lengths.append(len(fragment))
+                self._keyword_users.append([])
+                self._fragments.add(fragment, keyword)
+            self._keyword_users[keyword].append((i, k))
+        if not (prefix or suffix or middle):
+            self._always.append(i)
+
+    def match(self: RulesMatcher, path: str) -> list[int]:
+        """Find the rules matching a path.
+
+        Args:
+            path: STP path
+
+        Returns:
+            Indices of matching rules in ascending order.
+        """
+        state = self._match_fragments(path)
+        matched = set(self._always)
+        middle_size = self._middle_size
+        suffix_size = self._suffix_size
+        matched.update(
+            r for r, (k, _) in state.items() if k == middle_size[r] and suffix_size[r] < 0
+        )
+        prefix_size = self._prefix_size
+        path_length = len(path)
+        for depth, rules in self._suffixes.walk(reversed(path)):
+            for r in rules:
+                if prefix_size[r] < 0 and not middle_size[r]:
+                    matched.add(r)
+                    continue
+                current = state.get(r)
+                if (
+                    current is not None
+                    and current[0] == middle_size[r]
+                    and path_length - depth >= current[1]
+                ):
+                    matched.add(r)
+        return sorted(matched)
+
+    def _match_fragments(self: RulesMatcher, path: str) -> dict[int, tuple[int, int]]:
+        """Match prefixes and middle fragments of the patterns greedily.
+
+        Returns:
+            Map: rule -> (number of matched middle fragments, end of the last matched fragment)
+        """
+        state: dict[int, tuple[int, int]] = {}
+        prefix_size = self._prefix_size
+        for depth, rules in self._prefixes.walk(path):
+            for r in rules:
+                state[r] = (0, depth)
+        lengths = self._keyword_lengths
+        users = self._keyword_users
+        for end, keyword in self._fragments.search(path):
+            start = end - lengths[keyword]
+            for r, k in users[keyword]:
+                current = state.get(r)
+                if current is None:
+                    if prefix_size[r] >= 0 or k:
+                        continue
+                    current = (0, 0)
+                if current[0] == k and start >= current[1]:
+                    state[r] = (k + 1, end)
+        return state
+
+    def pairs(self: RulesMatcher, path: str) -> Iterator[tuple[tuple[str, str], ...]]:
+        """Yield tags of the rules matching a path in the order of priority.
+
+        Args:
+            path: STP path
+
+        Yields:
+            key-value pairs of every matching rule
+        """
+        for r in self.match(path):
+            yield self.rules[r].pairs
@@ -1,17 +1,58 @@
-"""Major methods to create accompanying Excel output file."""
+"""Major methods to create accompanying Excel output file and other cell tables.
+
+Parquet and Feather (Arrow IPC) outputs require optional dependency pyarrow,
+install it with `mapstp[arrow]` extra.
+"""
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
+import json
+import math
 import sqlite3 as sq
 
-import numpy as np
+from contextlib import closing
+from itertools import islice
+from logging import getLogger
+
 import pandas as pd
 
+from openpyxl import Workbook
+
+from mapstp.shared_table import save_shared_table
+from mapstp.utils import open_text_output
+
 if TYPE_CHECKING:
+    from typing import TextIO
+
+    from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
     from pathlib import Path
 
+    from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+
+logger = getLogger()
+
+EXCEL_MAX_ROWS = 1_048_576
+"""Maximum number of rows in Excel sheet."""
+
+CELL_INFO_COLUMNS = ("material_number", "density", "factor", "rwcl", "volume", "path")
+"""Columns of the cell table in SQL, Parquet, Feather and CSV outputs, the index is cell."""
+
+BBOX_COLUMNS = ("xmin", "ymin", "zmin", "xmax", "ymax", "zmax")
+"""Columns of cell bounding box in path information table."""
+
+SQL_CHUNK_SIZE = 50_000
+"""Number of rows inserted to SQLite at once."""
+
+SQL_INDEXED_COLUMNS = ("material_number", "rwcl", "stp_path")
+"""Columns of 'cell_info' table indexed for queries."""
+
+_MIN_SHEET_ROWS = 2  # header and at least one row
+
+MAX_REPORTED_PATHS = 10
+"""How many unmatched paths to show in the log message."""
+
 
 def combine_cell_table(
     joined_paths: list[str],
@@ -25,7 +66,13 @@ def combine_cell_table(
         joined_paths: STP paths for each cell
         path_info: number, density, factor for each cell
         start_cell_number: number to start cell numbering in the Excel, default 1
-        volumes_map: json with cell volumes, optional
+        volumes_map: json with cell volumes, optional,
+                     the keys are STP paths prefixed with '/'
+
+    Note:
+        The cells of linked bodies share the same STP path, all of them get the path volume.
+        The cells without a volume get NaN, the volumes not matching any cell are skipped,
+        both cases are reported in the log.
 
     Returns:
          The dataframe with cell, material, density, factor, rwcl id, STP path and volume.
@@ -44,20 +91,39 @@ def combine_cell_table(
         "STP path",
     ]
     if volumes_map:
-        temp_df["volume"] = np.empty((paths_length,), dtype=float)
-        temp_df = temp_df.set_index("STP path")
-        for k, v in volumes_map.items():
-            temp_df.loc[k[1:], "volume"] = v  # omit the first '/'
-        temp_df = temp_df.reset_index()
+        volumes = pd.Series(
+            {k[1:]: v for k, v in volumes_map.items()},  # omit the first '/'
+            dtype=float,
+        )
+        temp_df["volume"] = temp_df["STP path"].map(volumes)
+        _report_unmatched_volumes(temp_df, volumes)
     else:
         temp_df["volume"] = None
     temp_df = temp_df[columns]
     return temp_df.set_index("cell")
 
 
+def _report_unmatched_volumes(cell_table: pd.DataFrame, volumes: pd.Series) -> None:
+    no_volume = cell_table.loc[cell_table["volume"].isna(), "STP path"].unique()
+    if len(no_volume):
+        logger.warning(
+            "Volumes are not found for %d paths: %s",
+            len(no_volume),
+            ", ".join(no_volume[:MAX_REPORTED_PATHS]),
+        )
+    no_cell = volumes.index.difference(pd.Index(cell_table["STP path"]))
+    if len(no_cell):
+        logger.warning(
+            "No cells are found for %d paths with volumes: %s",
+            len(no_cell),
+            ", ".join(no_cell[:MAX_REPORTED_PATHS]),
+        )
+
+
 def create_excel(
     excel: Path,
     cell_info: pd.DataFrame,
+    max_rows: int = EXCEL_MAX_ROWS,
 ) -> None:
     """Write Excel file presenting information for each cell.
 
@@ -66,48 +132,243 @@ def create_excel(
     Args:
         excel: output Excel file name
         cell_info: table with information associated with cells
+        max_rows: maximum number of rows in a sheet including header, see :func:`write_excel_rows`
     """
-    with pd.ExcelWriter(excel) as xlsx:
-        cell_info.to_excel(xlsx, sheet_name="Cells")
+    header = [cell_info.index.name, *cell_info.columns]
+    write_excel_rows(excel, header, cell_info.itertuples(name=None), max_rows)
+
+
+def write_excel_rows(
+    excel: Path,
+    header: Sequence[str | None],
+    rows: Iterable[Sequence[Any]],
+    max_rows: int = EXCEL_MAX_ROWS,
+) -> None:
+    """Stream rows to Excel file with bounded memory.
+
+    The workbook is written in openpyxl write-only mode, the rows are not
+    collected in memory. When a sheet is full, the rows continue in
+    the next sheet: "Cells", "Cells_2", "Cells_3", and so on, each one starts with the header.
+    NaN values are written as empty cells.
+
+    Args:
+        excel: output Excel file name
+        header: column names
+        rows: the rows to write
+        max_rows: maximum number of rows in a sheet including header
+
+    Raises:
+        ValueError: if `max_rows` is out of range from 2 to :data:`EXCEL_MAX_ROWS`.
+    """
+    if not _MIN_SHEET_ROWS <= max_rows <= EXCEL_MAX_ROWS:
+        msg = (
+            f"The number of rows in Excel sheet should be from {_MIN_SHEET_ROWS} "
+            f"to {EXCEL_MAX_ROWS}, got {max_rows}"
+        )
+        raise ValueError(msg)
+    workbook = Workbook(write_only=True)
+    sheet_number = 1
+    sheet = _create_sheet(workbook, "Cells", header)
+    sheet_rows = 1
+    for row in rows:
+        if sheet_rows == max_rows:
+            sheet_number += 1
+            sheet = _create_sheet(workbook, f"Cells_{sheet_number}", header)
+            sheet_rows = 1
+        sheet.append([None if pd.isna(value) else value for value in row])
+        sheet_rows += 1
+    workbook.save(excel)
+
+
+def _create_sheet(
+    workbook: Workbook,
+    title: str,
+    header: Sequence[str | None],
+) -> WriteOnlyWorksheet:
+    sheet = workbook.create_sheet(title)
+    sheet.append(list(header))
+    return sheet
 
 
 # noinspection SqlNoDataSourceInspection,SqlResolve
 def create_sql(
     sql: Path,
     cell_info: pd.DataFrame,
+    chunk_size: int = SQL_CHUNK_SIZE,
 ) -> None:
-    """Write Excel file presenting information for each cell.
+    """Write SQLite3 table 'cell_info' presenting information for each cell.
 
     The information includes material number, density, fraction applied, rwcl id, and STP path.
 
+    The rows are inserted in chunks in one transaction with journal in memory and
+    without syncing to disk, then the indexes on material_number, rwcl and stp_path are created.
+
     Note:
         stp_path is not unique: cells corresponding to linked bodies have the same stp path
 
     Args:
         sql: output SQLite3 file name
         cell_info: table with information associated with cells
+        chunk_size: number of rows to insert at once
     """
-    with sq.connect(sql) as con:
-        # noinspection SqlNoDataSourceInspection
-        cur = con.cursor()
-        cur.executescript(
-            """
-            drop table if exists cell_info;
-            create table cell_info (
-                cell integer primary key,
-                material_number integer,
-                density real,
-                factor real,
-                rwcl text,
-                volume real,
-                stp_path text
-            );
-            """,
-        )
-        cur.executemany(
-            """
-            insert into cell_info(cell, material_number, density, factor, rwcl, volume, stp_path)
-            values(?,?,?,?,?,?,?)
-            """,
-            list(map(tuple, cell_info.reset_index().itertuples(index=False))),
-        )
+    rows = cell_info.reset_index().itertuples(index=False, name=None)
+    with closing(sq.connect(sql, isolation_level=None)) as con:
+        con.execute("pragma journal_mode = memory")
+        con.execute("pragma synchronous = off")
+        with con:
+            con.execute("begin")
+            con.execute("drop table if exists cell_info")
+            con.execute(
+                """
+                create table cell_info (
+                    cell integer primary key,
+                    material_number integer,
+                    density real,
+                    factor real,
+                    rwcl text,
+                    volume real,
+                    stp_path text
+                )
+                """,
+            )
+            while chunk := list(islice(rows, chunk_size)):
+                con.executemany(
+                    """
+                    insert into cell_info(
+                        cell, material_number, density, factor, rwcl, volume, stp_path
+                    )
+                    values(?,?,?,?,?,?,?)
+                    """,
+                    chunk,
+                )
+            for column in SQL_INDEXED_COLUMNS:
+                con.execute(f"create index cell_info_{column} on cell_info({column})")
+
+
+def typed_cell_table(cell_info: pd.DataFrame) -> pd.DataFrame:
+    """Convert cell table columns to the types suitable for columnar formats.
+
+    The material numbers become nullable integers and rwcl - categorical.
+
+    Args:
+        cell_info: table with information associated with cells
+
+    Returns:
+        The table with converted columns.
+    """
+    types = {"material_number": "Int64", "rwcl": "category"}
+    return cell_info.astype({k: v for k, v in types.items() if k in cell_info.columns})
+
+
+def create_parquet(path: Path, cell_info: pd.DataFrame) -> None:
+    """Write cell table to Parquet file.
+
+    Args:
+        path: output file name
+        cell_info: table with information associated with cells
+    """
+    typed_cell_table(cell_info).to_parquet(path, engine="pyarrow")
+
+
+def create_feather(path: Path, cell_info: pd.DataFrame) -> None:
+    """Write cell table to Feather (Arrow IPC) file.
+
+    Feather doesn't store index, so, the cells are stored in the first column.
+
+    Args:
+        path: output file name
+        cell_info: table with information associated with cells
+    """
+    typed_cell_table(cell_info).reset_index().to_feather(path)
+
+
+def create_csv(
+    path: Path,
+    cell_info: pd.DataFrame,
+    compression_level: int | None = None,
+) -> None:
+    """Write cell table to CSV file.
+
+    The file is compressed, if its suffix is `.gz`, `.xz` or `.bz2`,
+    see :func:`mapstp.utils.open_text_output`.
+
+    Args:
+        path: output file name
+        cell_info: table with information associated with cells
+        compression_level: compression level for compressed file, if None - default
+    """
+    with open_text_output(path, compression_level) as stream:
+        cell_info.to_csv(stream)
+
+
+CELL_TABLE_WRITERS: dict[str, Callable[[Path, pd.DataFrame], None]] = {
+    "parquet": create_parquet,
+    "feather": create_feather,
+    "csv": create_csv,
+    "shared_table": save_shared_table,
+}
+"""Writers of cell table by output format."""
+
+
+def iter_cell_records(path_info: pd.DataFrame) -> Iterator[dict[str, Any]]:
+    """Iterate over rows of path information table as mappings column -> value.
+
+    Args:
+        path_info: table with information associated with cells, indexed by cell
+
+    Yields:
+        the rows including the cell number
+    """
+    columns = [path_info.index.name or "cell", *path_info.columns]
+    for row in path_info.itertuples(name=None):
+        yield dict(zip(columns, row, strict=True))
+
+
+def ndjson_record(row: Mapping[str, Any]) -> dict[str, Any]:
+    """Convert path information row to NDJSON record.
+
+    The missing and NaN values are presented as null.
+    The bounding box is a list [xmin, ymin, zmin, xmax, ymax, zmax] or null if not known.
+
+    Args:
+        row: mapping column -> value like in :func:`mapstp.workflow_sql.iter_path_info`
+
+    Returns:
+        The record with cell, material, density, factor, rwcl, volume, bbox and path.
+    """
+    bbox = [_json_value(row.get(column)) for column in BBOX_COLUMNS]
+    return {
+        "cell": _json_value(row["cell"]),
+        "material": _json_value(row.get("material_number")),
+        "density": _json_value(row.get("density")),
+        "factor": _json_value(row.get("factor")),
+        "rwcl": _json_value(row.get("rwcl")),
+        "volume": _json_value(row.get("volume")),
+        "bbox": None if all(v is None for v in bbox) else bbox,
+        "path": _json_value(row.get("path")),
+    }
+
+
+def write_ndjson(stream: TextIO, rows: Iterable[Mapping[str, Any]]) -> int:
+    """Write NDJSON records one per line as the rows come.
+
+    Args:
+        stream: output text stream
+        rows: path information rows, see :func:`ndjson_record`
+
+    Returns:
+        The number of written records.
+    """
+    count = 0
+    for row in rows:
+        stream.write(json.dumps(ndjson_record(row), ensure_ascii=False))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def _json_value(value: object) -> object:
+    if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    item = getattr(value, "item", None)
+    return item() if callable(item) else value
@@ -0,0 +1,245 @@
+"""Cell table shared by worker processes through memory mapped files.
+
+The table is stored in a directory as NumPy `.npy` file per numeric column,
+the string columns are stored as UTF-8 heap of concatenated values with
+`.npy` array of offsets. The description of the columns is written to
+`table.json` last, so, the directory is readable only when complete.
+
+A worker opens the directory with :class:`SharedTable`, the columns are mapped read-only,
+so, all the workers share one copy of the data in the operating system page cache,
+without parsing or pickling. :class:`SharedTable` is pickled as the directory path,
+so, it can be passed to a process pool directly.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, cast
+
+import json
+
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Iterator
+
+TABLE_FILE_NAME = "table.json"
+"""Name of the file describing the columns in the shared table directory."""
+
+INTEGER_COLUMNS = ("material_number",)
+"""Columns stored as integers with missing values mask by default."""
+
+STRING_COLUMNS = ("rwcl", "path")
+"""Columns stored as strings by default, even if the values look like numbers."""
+
+_NUMERIC_VALUES = frozenset(("empty", "floating", "integer", "mixed-integer-float", "decimal"))
+"""Results of :func:`pandas.api.types.infer_dtype` for object columns stored as floats."""
+
+ColumnArray = np.ndarray[Any, Any]
+
+
+def save_shared_table(
+    directory: Path,
+    cell_info: pd.DataFrame,
+    integer_columns: Collection[str] = INTEGER_COLUMNS,
+    string_columns: Collection[str] = STRING_COLUMNS,
+) -> None:
+    """Write cell table to a directory to be memory mapped with :class:`SharedTable`.
+
+    The index (cell) and numeric columns are stored as NumPy arrays, the other
+    columns - as strings. The kind of a column is defined by its name and dtype,
+    for object columns - by the type of the values, but not by the values themselves,
+    so, rwcl "01" remains a string. The missing values of integer and string columns
+    are denoted with boolean mask, for float columns - with NaN.
+
+    Args:
+        directory: output directory, created if not exists
+        cell_info: table with information associated with cells
+        integer_columns: columns to store as integers
+        string_columns: columns to store as strings
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    table_file = directory / TABLE_FILE_NAME
+    table_file.unlink(missing_ok=True)
+    index = cell_info.index.to_series()
+    columns = [
+        _save_column(directory, str(name), column, integer_columns, string_columns)
+        for name, column in [(index.name or "index", index), *cell_info.items()]
+    ]
+    description = {"rows": len(cell_info), "index": columns[0]["name"], "columns": columns}
+    table_file.write_text(json.dumps(description, indent=2), encoding="utf-8")
+
+
+def _save_column(
+    directory: Path,
+    name: str,
+    column: pd.Series,
+    integer_columns: Collection[str],
+    string_columns: Collection[str],
+) -> dict[str, Any]:
+    missing = column.isna().to_numpy()
+    if pd.api.types.is_integer_dtype(column.dtype) or name in integer_columns:
+        values = pd.to_numeric(column).astype("Int64").to_numpy(dtype=np.int64, na_value=0)
+        np.save(directory / f"{name}.npy", values)
+        return {"name": name, "kind": "integer", "missing": _save_missing(directory, name, missing)}
+    if name not in string_columns and _is_float_column(column):
+        np.save(directory / f"{name}.npy", pd.to_numeric(column).astype(float).to_numpy())
+        return {"name": name, "kind": "float", "missing": False}
+    encoded = [
+        b"" if is_missing else str(value).encode()
+        for value, is_missing in zip(column, missing, strict=True)
+    ]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(directory / f"{name}.offsets.npy", offsets)
+    with (directory / f"{name}.heap").open("wb") as stream:
+        stream.writelines(encoded)
+    return {"name": name, "kind": "string", "missing": _save_missing(directory, name, missing)}
+
+
+def _is_float_column(column: pd.Series) -> bool:
+    dtype = column.dtype
+    if pd.api.types.is_object_dtype(dtype):
+        return pd.api.types.infer_dtype(column, skipna=True) in _NUMERIC_VALUES
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _save_missing(directory: Path, name: str, missing: ColumnArray) -> bool:
+    if not missing.any():
+        return False
+    np.save(directory / f"{name}.missing.npy", missing)
+    return True
+
+
+class SharedStrings:
+    """String column of :class:`SharedTable`, the values are decoded on access."""
+
+    def __init__(
+        self: SharedStrings,
+        heap: ColumnArray,
+        offsets: ColumnArray,
+        missing: ColumnArray | None,
+    ) -> None:
+        """Create string column from memory mapped arrays.
+
+        Args:
+            heap: UTF-8 bytes of the values
+            offsets: start of every value in the heap and the end of the last one
+            missing: mask of missing values, if any
+        """
+        self.heap = heap
+        self.offsets = offsets
+        self.missing = missing
+
+    def __len__(self: SharedStrings) -> int:
+        """Count values."""
+        return len(self.offsets) - 1
+
+    def __getitem__(self: SharedStrings, i: int) -> str | None:
+        """Decode i-th value."""
+        if self.missing is not None and self.missing[i]:
+            return None
+        return self.heap[self.offsets[i] : self.offsets[i + 1]].tobytes().decode()
+
+    def __iter__(self: SharedStrings) -> Iterator[str | None]:
+        """Decode values one by one."""
+        return (self[i] for i in range(len(self)))
+
+
+class SharedTable(Mapping[str, "ColumnArray | SharedStrings"]):
+    """Read-only view of the table written with :func:`save_shared_table`.
+
+    The columns are mapped from the files on the first access.
+    """
+
+    def __init__(self: SharedTable, directory: Path | str) -> None:
+        """Open shared table.
+
+        Args:
+            directory: the directory written with :func:`save_shared_table`
+
+        Raises:
+            FileNotFoundError: if the table is not found or not complete.
+        """
+        self.directory = Path(directory)
+        table_file = self.directory / TABLE_FILE_NAME
+        if not table_file.exists():
+            raise FileNotFoundError(table_file)
+        description = json.loads(table_file.read_text(encoding="utf-8"))
+        self.rows: int = description["rows"]
+        self.index_name: str = description["index"]
+        self._columns: dict[str, dict[str, Any]] = {c["name"]: c for c in description["columns"]}
+        self._mapped: dict[str, ColumnArray | SharedStrings] = {}
+
+    def __reduce__(self: SharedTable) -> tuple[type[SharedTable], tuple[str]]:
+        """Pickle as the directory path, the worker maps the files itself."""
+        return SharedTable, (str(self.directory),)
+
+    def __getitem__(self: SharedTable, name: str) -> ColumnArray | SharedStrings:
+        """Map the column.
+
+        Args:
+            name: column name
+
+        Returns:
+            Read-only NumPy array for numeric column or :class:`SharedStrings`.
+        """
+        column = self._mapped.get(name)
+        if column is None:
+            self._mapped[name] = column = self._map_column(self._columns[name])
+        return column
+
+    def __iter__(self: SharedTable) -> Iterator[str]:
+        """Iterate over column names including the index."""
+        return iter(self._columns)
+
+    def __len__(self: SharedTable) -> int:
+        """Count columns including the index."""
+        return len(self._columns)
+
+    def missing(self: SharedTable, name: str) -> ColumnArray | None:
+        """Get mask of missing values of integer or string column.
+
+        Args:
+            name: column name
+
+        Returns:
+            The mask or None, if there are no missing values or the column is float.
+        """
+        if not self._columns[name]["missing"]:
+            return None
+        return cast("ColumnArray", np.load(self.directory / f"{name}.missing.npy", mmap_mode="r"))
+
+    def to_frame(self: SharedTable) -> pd.DataFrame:
+        """Copy the table to DataFrame like the one written.
+
+        Returns:
+            The table with the cells as index.
+        """
+        data: dict[str, Any] = {}
+        for name, description in self._columns.items():
+            column = self[name]
+            mask = self.missing(name)
+            if description["kind"] == "integer" and mask is not None:
+                values = pd.array(np.array(column, dtype=np.int64), dtype="Int64")
+                values[mask] = pd.NA
+                data[name] = values
+            else:
+                data[name] = list(column) if isinstance(column, SharedStrings) else np.array(column)
+        return pd.DataFrame(data).set_index(self.index_name)
+
+    def _map_column(self: SharedTable, description: dict[str, Any]) -> ColumnArray | SharedStrings:
+        name = description["name"]
+        if description["kind"] != "string":
+            return cast("ColumnArray", np.load(self.directory / f"{name}.npy", mmap_mode="r"))
+        heap_path = self.directory / f"{name}.heap"
+        heap = (
+            np.memmap(heap_path, dtype=np.uint8, mode="r")
+            if heap_path.stat().st_size
+            else np.empty(0, dtype=np.uint8)
+        )
+        offsets = np.load(self.directory / f"{name}.offsets.npy", mmap_mode="r")
+        return SharedStrings(heap, offsets, self.missing(name))
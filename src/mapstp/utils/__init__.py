@@ -2,10 +2,14 @@
 
 from __future__ import annotations
 
+from ._cache import FileSignature, cache_dir, file_signature
 from ._io import (
+    COMPRESSED_SUFFIXES,
     MCNPSections,
     can_override,
     find_first_cell_number,
+    open_binary,
+    open_text_output,
     read_mcnp_sections,
     select_output,
 )
@@ -23,13 +27,19 @@ __all__ = [
     "CARD_PATTERN",
     "CELLS_END_PATTERN",
     "CELL_START_PATTERN",
+    "COMPRESSED_SUFFIXES",
     "MATERIAL_PATTERN",
     "MCNP_SECTIONS_SEPARATOR_PATTERN",
     "VOID_CELL_START_PATTERN",
+    "FileSignature",
     "MCNPSections",
+    "cache_dir",
     "can_override",
     "decode_russian",
+    "file_signature",
     "find_first_cell_number",
+    "open_binary",
+    "open_text_output",
     "read_mcnp_sections",
     "select_output",
 ]
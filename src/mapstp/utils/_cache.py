@@ -0,0 +1,45 @@
+"""Location and validation of persistent caches.
+
+The caches are stored in the directory specified with environment variable
+`MAPSTP_CACHE_DIR`, or in `mapstp` subdirectory of the user cache directory
+(`XDG_CACHE_HOME` or `~/.cache`).
+A cached item is valid while the signature of its source file is not changed.
+"""
+
+from __future__ import annotations
+
+import os
+
+from pathlib import Path
+
+FileSignature = tuple[int, int]
+"""File size and modification time in nanoseconds."""
+
+
+def cache_dir() -> Path:
+    """Get directory for persistent caches.
+
+    Returns:
+        The directory, it's created, if it doesn't exist.
+    """
+    env = os.getenv("MAPSTP_CACHE_DIR")
+    if env:
+        path = Path(env)
+    else:
+        base = os.getenv("XDG_CACHE_HOME")
+        path = (Path(base) if base else Path.home() / ".cache") / "mapstp"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def file_signature(path: Path) -> FileSignature:
+    """Compute signature to check if a file is changed.
+
+    Args:
+        path: the file
+
+    Returns:
+        size and modification time of the file
+    """
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
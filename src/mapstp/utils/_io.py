@@ -2,10 +2,17 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, TextIO
+from typing import TYPE_CHECKING, Any, BinaryIO, TextIO, cast
 
+import bz2
+import gzip
+import io
+import lzma
 import os
+import queue
 import sys
+import threading
+import zipfile
 
 from contextlib import contextmanager
 from dataclasses import dataclass
@@ -20,10 +27,23 @@ from mapstp.utils._re import (
 )
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Callable, Iterator
 
 PathLike = str | Path | os.PathLike[Any]
 
+COMPRESSED_SUFFIXES: dict[str, Callable[..., Any]] = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".bz2": bz2.open,
+}
+"""Openers of compressed single file streams by file suffix."""
+
+COMPRESSION_LEVEL_KEYWORDS = {".gz": "compresslevel", ".xz": "preset", ".bz2": "compresslevel"}
+"""Names of compression level parameter of the openers in :data:`COMPRESSED_SUFFIXES`."""
+
+BACKGROUND_QUEUE_SIZE = 64
+"""Maximum number of chunks waiting for compression in background thread."""
+
 
 def can_override(path: Path, *, override: bool) -> Path:
     """Check if it's allowed to override a `path`.
@@ -96,14 +116,17 @@ def select_output(
     output: PathLike | None = None,
     *,
     override: bool,
+    compression_level: int | None = None,
 ) -> Iterator[TextIO]:
     """Select stream for output.
 
     If the `output` is specified, then checks if we can override it.
+    The output is compressed, if its suffix is `.gz`, `.xz` or `.bz2`, see :func:`open_text_output`.
 
     Args:
         output: optional file name for output stream
         override: permission to override, if `output` file exists
+        compression_level: compression level for compressed output, if None - default
 
     Yields:
         stdout, if `output` file name is  not specified (None),
@@ -112,15 +135,136 @@ def select_output(
     if output:
         p = Path(output)
         can_override(p, override=override)
-        _output: TextIO = p.open(mode="w", encoding="utf8")
         logger.info("Tagged mcnp will be saved to {}", p)
+        with open_text_output(p, compression_level) as stream:
+            yield stream
+    else:
+        yield sys.stdout
+
+
+@contextmanager
+def open_text_output(
+    path: PathLike,
+    compression_level: int | None = None,
+    encoding: str = "utf8",
+) -> Iterator[TextIO]:
+    """Open a plain or compressed text file for writing.
+
+    The files with suffixes `.gz`, `.xz` and `.bz2` are compressed
+    in a background thread, so, the compression overlaps with producing the text.
+
+    Args:
+        path: the file to write
+        compression_level: compression level from 1 to 9, if None - default for the format,
+                           ignored for plain file
+        encoding: the text encoding
+
+    Yields:
+        The text stream.
+    """
+    p = Path(path)
+    suffix = p.suffix.lower()
+    opener = COMPRESSED_SUFFIXES.get(suffix)
+    if opener is None:
+        with p.open(mode="w", encoding=encoding) as stream:
+            yield stream
+        return
+    kwargs = (
+        {} if compression_level is None else {COMPRESSION_LEVEL_KEYWORDS[suffix]: compression_level}
+    )
+    compressed = opener(p, "wb", **kwargs)
+    raw = _BackgroundWriter(compressed)
+    with io.TextIOWrapper(io.BufferedWriter(raw), encoding=encoding) as stream:
+        yield stream
+
+
+class _BackgroundWriter(io.RawIOBase):
+    """Pass written chunks to a thread writing them to the target stream."""
+
+    def __init__(self: _BackgroundWriter, target: BinaryIO) -> None:
+        self._target = target
+        self._queue: queue.Queue[bytes | None] = queue.Queue(BACKGROUND_QUEUE_SIZE)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="background-writer", daemon=True)
+        self._thread.start()
+
+    def writable(self: _BackgroundWriter) -> bool:
+        return True
+
+    def write(self: _BackgroundWriter, data: Any) -> int:  # noqa: ANN401 - buffer protocol
+        if self._error is not None:
+            raise self._error
+        chunk = bytes(data)
+        self._queue.put(chunk)
+        return len(chunk)
+
+    def close(self: _BackgroundWriter) -> None:
+        if self.closed:
+            return
+        super().close()
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self: _BackgroundWriter) -> None:
+        with self._target:
+            while (chunk := self._queue.get()) is not None:
+                if self._error is None:
+                    try:
+                        self._target.write(chunk)
+                    except Exception as ex:  # noqa: BLE001 - raised in the writing thread
+                        self._error = ex
+
+
+@contextmanager
+def open_binary(path: PathLike, member: str | None = None) -> Iterator[BinaryIO]:
+    """Open a plain or compressed file for binary reading.
+
+    The files with suffixes `.zip`, `.gz`, `.xz` and `.bz2` are decompressed on reading.
+    The streams are seekable, but seeking backward restarts decompression,
+    so, the content is to be accessed in forward direction.
+
+    Args:
+        path: the file to read
+        member: name of a file in zip archive,
+                may be omitted, if the archive contains only one file
+
+    Yields:
+        The binary stream.
+
+    Raises:
+        ValueError: if the `member` cannot be selected.
+    """
+    p = Path(path)
+    suffix = p.suffix.lower()
+    if suffix == ".zip":
+        with zipfile.ZipFile(p) as archive, archive.open(_zip_member(archive, member, p)) as stream:
+            yield cast("BinaryIO", stream)
+        return
+    if member is not None:
+        msg = f"Cannot select member {member!r}: {p} is not a zip archive"
+        raise ValueError(msg)
+    opener = COMPRESSED_SUFFIXES.get(suffix)
+    if opener is None:
+        with p.open("rb") as stream:
+            yield stream
     else:
-        _output = sys.stdout
-    try:
-        yield _output
-    finally:
-        if _output is not sys.stdout:
-            _output.close()
+        with opener(p, "rb") as stream:
+            yield cast("BinaryIO", stream)
+
+
+def _zip_member(archive: zipfile.ZipFile, member: str | None, path: Path) -> str:
+    names = [name for name in archive.namelist() if not name.endswith("/")]
+    if member is None:
+        if len(names) == 1:
+            return names[0]
+        msg = f"Select a member of zip archive {path}, one of: {', '.join(names)}"
+        raise ValueError(msg)
+    if member not in names:
+        msg = f"Member {member!r} is not found in zip archive {path}"
+        raise ValueError(msg)
+    return member
 
 
 @dataclass
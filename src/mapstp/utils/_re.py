@@ -2,8 +2,13 @@
 
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
+
 import re
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
 CELL_START_PATTERN = re.compile(r"^\s{0,5}(?P<number>\d+)\s+(?P<material>\d+)\s+")
 """Line starts with two numbers."""
 
@@ -24,6 +29,27 @@ CARD_PATTERN = re.compile(r"^\s{0,4}(?:(?P<comment>[cC]\s)|(?P<card>\w+))")
 
 MCNP_SECTIONS_SEPARATOR_PATTERN = re.compile(r"^\s*$", re.MULTILINE)
 
-#
-# Advise: check regular expressions on: https://pythex.org/
-#
+COMMENT_LINE_PATTERN = re.compile(r"\n[^\S\n]{0,4}[cC](?=\s)[^\n]*")
+"""Comment line with the preceding new line character, see :data:`COMMENT_LINE_BYTES_PATTERN`."""
+
+
+def _cp1251_class(predicate: Callable[[str], bool]) -> bytes:
+    chars = (bytes([b]) for b in range(256))
+    return re.escape(b"".join(c for c in chars if predicate(c.decode("cp1251", errors="replace"))))
+
+
+_BLANK = _cp1251_class(lambda c: c.isspace() and c != "\n")
+_WORD = _cp1251_class(lambda c: c.isalnum() or c == "_")
+
+MATERIALS_CARD_START_PATTERN = re.compile(
+    rb"\n[%b]{0,4}(?:[mM](?P<material>[0-9]+)|(?![cC][%b\n])[%b])" % (_BLANK, _BLANK, _WORD),
+)
+"""Start of a material or other card line in cp1251 encoded text.
+
+Bytes version of :data:`CARD_PATTERN` and :data:`MATERIAL_PATTERN` skipping comments.
+Matches from the new line character preceding a line,
+so, comments and continuation lines are skipped in a single search.
+"""
+
+COMMENT_LINE_BYTES_PATTERN = re.compile(rb"\n[%b]{0,4}[cC](?=[%b\n])[^\n]*" % (_BLANK, _BLANK))
+"""Comment line in cp1251 encoded text with the preceding new line character."""
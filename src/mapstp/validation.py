@@ -0,0 +1,225 @@
+"""Validate meta information of all the cells in one pass.
+
+The checks are applied to the whole table of cells at once,
+so, all the problems in tags and material index are reported in one run,
+before any output is written.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from mapstp.extract_info import collect_path_meta_info
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from mapstp.rules import RulesMatcher
+
+ISSUE_COLUMNS = ["cell", "issue", "value", "path"]
+"""Columns of a validation report table."""
+
+
+@dataclass(frozen=True)
+class ValidationReport:
+    """Issues found on validation of cells meta information."""
+
+    issues: pd.DataFrame
+    """Table with columns `cell`, `issue`, `value`, `path`, one row per issue."""
+
+    @property
+    def ok(self: ValidationReport) -> bool:
+        """Check if there are no issues.
+
+        Returns:
+            True, if no issues were found
+        """
+        return self.issues.empty
+
+    def summary(self: ValidationReport, max_cells: int = 5) -> str:
+        """Present the issues grouped by kind and value.
+
+        Args:
+            max_cells: maximum number of cells to list for every group of issues
+
+        Returns:
+            Text of the report.
+        """
+        if self.ok:
+            return "No issues found."
+        cells_number = self.issues["cell"].nunique()
+        lines = [f"Found {len(self.issues)} issue(s) in {cells_number} cell(s):"]
+        for (issue, value), group in self.issues.groupby(["issue", "value"], sort=False):
+            cells = group["cell"].tolist()
+            listed = ", ".join(map(str, cells[:max_cells]))
+            if len(cells) > max_cells:
+                listed += ", ..."
+            lines.append(f"  {issue} {value!r}: {len(cells)} cell(s): {listed}")
+            lines.append(f"      see the STP path: {group['path'].iloc[0]}")
+        return "\n".join(lines)
+
+
+def validate_paths(
+    paths: list[str],
+    material_index: pd.DataFrame,
+    cells: Sequence[int] | None = None,
+    *,
+    rules: RulesMatcher | None = None,
+) -> ValidationReport:
+    """Check meta information for all the `paths` against `material_index`.
+
+    The following issues are collected:
+
+        - malformed tags, which cannot be split to `key-value` pairs, or have invalid factor
+        - mnemonics not specified in the material index
+        - mnemonics specified in the material index several times
+        - missed or negative densities and not positive material numbers for used mnemonics
+        - negative density correction factors
+
+    Args:
+        paths: STP paths
+        material_index: table mapping material mnemonics to material number and density
+        cells: cell numbers corresponding to `paths`, default - row numbers
+        rules: compiled tagging rules, applied before the inline tags
+
+    Returns:
+        The report with all the found issues.
+    """
+    return validate_scenarios(paths, [material_index], cells, rules=rules)[0]
+
+
+def validate_scenarios(
+    paths: list[str],
+    material_indexes: Sequence[pd.DataFrame],
+    cells: Sequence[int] | None = None,
+    *,
+    rules: RulesMatcher | None = None,
+    jobs: int | None = 1,
+) -> list[ValidationReport]:
+    """Check meta information for all the `paths` against several material indexes.
+
+    The tags are extracted from the paths once for all the indexes,
+    on several `jobs` like in :func:`mapstp.extract_info.extract_path_meta_info`.
+    The issues not depending on a material index, like malformed tags,
+    are reported for every index.
+
+    Args:
+        paths: STP paths
+        material_indexes: tables mapping material mnemonics to material number and density
+        cells: cell numbers corresponding to `paths`, default - row numbers
+        rules: compiled tagging rules, applied before the inline tags
+        jobs: number of processes to extract tags, None or 0 - all CPUs
+
+    Returns:
+        The reports with all the found issues for every index.
+    """
+    meta_info, malformed = collect_path_meta_info(paths, jobs, rules=rules)
+    return check_meta_info(meta_info, malformed, material_indexes, paths, cells)
+
+
+def check_meta_info(
+    meta_info: pd.DataFrame,
+    malformed: list[tuple[int, str]],
+    material_indexes: Sequence[pd.DataFrame],
+    paths: Sequence[str],
+    cells: Sequence[int] | None = None,
+) -> list[ValidationReport]:
+    """Check already collected meta information against several material indexes.
+
+    Args:
+        meta_info: table with `mnemonic`, `factor` and `rwcl` for every path
+        malformed: pairs (row, tag contents) of malformed tags
+        material_indexes: tables mapping material mnemonics to material number and density
+        paths: STP paths corresponding to `meta_info` rows
+        cells: cell numbers corresponding to `paths`, default - row numbers
+
+    Returns:
+        The reports with all the found issues for every index,
+        see :func:`validate_paths` for the list of checks.
+    """
+    _cells = np.arange(len(paths)) if cells is None else np.asarray(cells)
+    _paths = np.asarray(paths, dtype=object)
+    categorical = pd.Categorical(meta_info["mnemonic"])
+    return [
+        _check(meta_info, categorical, malformed, material_index, cells=_cells, paths=_paths)
+        for material_index in material_indexes
+    ]
+
+
+def _check(  # noqa: PLR0913
+    meta_info: pd.DataFrame,
+    categorical: pd.Categorical,
+    malformed: list[tuple[int, str]],
+    material_index: pd.DataFrame,
+    *,
+    cells: np.ndarray,
+    paths: np.ndarray,
+) -> ValidationReport:
+    codes = categorical.codes
+    duplicated_index = material_index.index.duplicated(keep="first")
+    # the appended False is picked by the code -1 of the cells without mnemonic
+    duplicated = np.append(
+        categorical.categories.isin(material_index.index[duplicated_index]),
+        False,
+    )[codes]
+    lookup = material_index.loc[~duplicated_index].reindex(categorical.categories)
+    numbers = _spread(lookup["number"].to_numpy(dtype=float), codes)
+    densities = _spread(lookup["density"].to_numpy(dtype=float), codes)
+    mnemonics = meta_info["mnemonic"].to_numpy()
+    factors = meta_info["factor"].to_numpy()
+
+    defined = codes >= 0
+    unknown = defined & np.isnan(numbers)
+    known = defined & ~unknown
+    checks = [
+        ("unknown mnemonic", unknown, mnemonics),
+        (
+            "duplicated mnemonic in material index",
+            duplicated,
+            mnemonics,
+        ),
+        ("missed density for mnemonic", known & np.isnan(densities), mnemonics),
+        ("negative density for mnemonic", known & (densities < 0.0), mnemonics),
+        ("not positive material number for mnemonic", known & (numbers <= 0.0), mnemonics),
+        ("negative factor", factors < 0.0, factors),
+    ]
+    frames = [
+        pd.DataFrame(
+            {
+                "cell": cells[mask],
+                "issue": issue,
+                "value": values[mask],
+                "path": paths[mask],
+            },
+        )
+        for issue, mask, values in checks
+        if mask.any()
+    ]
+    if malformed:
+        rows = np.fromiter((r for r, _ in malformed), dtype=np.int64, count=len(malformed))
+        frames.insert(
+            0,
+            pd.DataFrame(
+                {
+                    "cell": cells[rows],
+                    "issue": "malformed tag",
+                    "value": [m for _, m in malformed],
+                    "path": paths[rows],
+                },
+            ),
+        )
+    if not frames:
+        return ValidationReport(pd.DataFrame(columns=ISSUE_COLUMNS))
+    return ValidationReport(pd.concat(frames, ignore_index=True))
+
+
+def _spread(values: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    result = np.full(codes.shape, np.nan)
+    defined = codes >= 0
+    result[defined] = values[codes[defined]]
+    return result
@@ -11,25 +11,38 @@ from typing import TYPE_CHECKING
 from logging import getLogger
 from pathlib import Path
 
-from mapstp.extract_info import extract_path_info
+from mapstp.exceptions import ValidationError
+from mapstp.extract_info import collect_path_meta_info, resolve_meta_info
 from mapstp.materials_index import load_materials_index
+from mapstp.rules import load_rules
 from mapstp.stp_parser import parse_path
 from mapstp.tree import create_bodies_paths
+from mapstp.validation import check_meta_info
 
 if TYPE_CHECKING:
     import pandas as pd
 
 
-def create_path_info(materials_index: str, stp: str) -> tuple[list[str], pd.DataFrame]:
+def create_path_info(
+    materials_index: str,
+    stp: str,
+    jobs: int | None = 1,
+    rules: str | None = None,
+) -> tuple[list[str], pd.DataFrame]:
     """Join information from materials index and stp paths to table.
 
     Args:
         materials_index: file name of materials index file.
         stp: file name of stp file.
+        jobs: number of processes to extract meta information, None or 0 - all CPUs
+        rules: file name of tagging rules, optional
 
     Returns:
         collected paths from the stp file
         table with joined information
+
+    Raises:
+        ValidationError: if tags or material index are not valid for the paths.
     """
     logger = getLogger()
     _materials_index = load_materials_index(materials_index)
@@ -38,5 +51,11 @@ def create_path_info(materials_index: str, stp: str) -> tuple[list[str], pd.Data
     products, links = parse_path(_stp)
     logger.info("Loaded STP from {}", stp)
     paths = create_bodies_paths(products, links)
-    path_info = extract_path_info(paths, _materials_index)
+    _rules = load_rules(rules) if rules else None
+    # the tags are extracted once for validation and resolving
+    meta_info, malformed = collect_path_meta_info(paths, jobs, rules=_rules)
+    report = check_meta_info(meta_info, malformed, [_materials_index], paths)[0]
+    if not report.ok:
+        raise ValidationError(report)
+    path_info = resolve_meta_info(meta_info, _materials_index, paths).drop(columns="mnemonic")
     return paths, path_info
@@ -5,57 +5,139 @@ The storage is produced with extract-volumes script from SpaceClaim.
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
+from dataclasses import dataclass
 from logging import getLogger
 
+import numpy as np
 import pandas as pd
 
+from mapstp.cells_index import save_cells_index, update_cells_index
 from mapstp.extract_info import (
-    define_material_number_and_density,
-    extract_meta_info_from_path,
+    collect_path_meta_info,
+    extract_path_meta_info,
+    meta_cache_info,
+    resolve_meta_info,
+    resolve_scenarios,
 )
 from mapstp.materials_index import load_materials_index
+from mapstp.validation import check_meta_info, validate_scenarios
 
 if TYPE_CHECKING:
     import sqlite3 as sq
 
-    from collections.abc import Generator
+    from collections.abc import Iterator, Sequence
 
+    from mapstp.rules import RulesMatcher
+    from mapstp.validation import ValidationReport
 
-def save_meta_info_from_paths(con: sq.Connection, materials_index: str) -> None:
+
+@dataclass(frozen=True)
+class CellsMetaInfo:
+    """Meta information collected from the paths of all the cells in a database.
+
+    Collected once, it is used both for validation and for resolving materials.
+    """
+
+    cells: np.ndarray
+    """Cell numbers in ascending order."""
+    paths: list[str]
+    """STP paths of the cells."""
+    meta_info: pd.DataFrame
+    """Table with `mnemonic`, `factor` and `rwcl` for every cell."""
+    malformed: list[tuple[int, str]]
+    """Pairs (row, tag contents) of malformed tags."""
+
+    @property
+    def has_mnemonics(self: CellsMetaInfo) -> bool:
+        """Check if any path is tagged with a material mnemonic.
+
+        Returns:
+            True, if there's a mnemonic to resolve with materials index.
+        """
+        return bool(self.meta_info["mnemonic"].notna().any())
+
+    def check_malformed(self: CellsMetaInfo) -> None:
+        """Check that there are no malformed tags.
+
+        Raises:
+            ValueError: on the first malformed tag.
+        """
+        if self.malformed:
+            row, meta = self.malformed[0]
+            msg = f"Malformed tag [{meta}] on path {self.paths[row]}"
+            raise ValueError(msg)
+
+
+def collect_cells_meta_info(
+    con: sq.Connection,
+    jobs: int | None = 1,
+    *,
+    rules: RulesMatcher | None = None,
+) -> CellsMetaInfo:
+    """Collect meta information from the paths of all the cells in the database.
+
+    Args:
+        con: connection to database
+        jobs: number of processes to extract meta information, None or 0 - all CPUs
+        rules: optional tagging rules
+
+    Returns:
+        The collected meta information with malformed tags.
+    """
+    cells, paths = _load_cells_paths(con)
+    meta_info, malformed = collect_path_meta_info(paths, jobs, rules=rules)
+    getLogger().debug("Tags parsing cache: %s", meta_cache_info())
+    return CellsMetaInfo(cells, paths, meta_info, malformed)
+
+
+def save_meta_info_from_paths(
+    con: sq.Connection,
+    materials_index: str | pd.DataFrame | None,
+    jobs: int | None = 1,
+    *,
+    rules: RulesMatcher | None = None,
+    collected: CellsMetaInfo | None = None,
+) -> None:
     """Store information from materials index corresponding to cells paths to SQL database.
 
     The database should contain a table cells, which has been generated
     with extract-info.py script from SpaceClaim. The numbers in this table are
     index of cells in MCNP model (starting from 1).
+    The inverted indexes from mnemonics, RWCL ids and material numbers to cells
+    are stored in the table `cells_index`, see :mod:`mapstp.cells_index`.
 
     Args:
         con: connection to database
-        materials_index: file name of materials index file.
-    """
-    logger = getLogger()
-    _materials_index = load_materials_index(materials_index)
-    logger.info("Loaded material index from {}", materials_index)
-
-    records = con.execute(
-        """
-        select cell, path from cells order by cell
-        """,
-    ).fetchall()
+        materials_index: file name of materials index file or already loaded index
+        jobs: number of processes to extract meta information, None or 0 - all CPUs
+        rules: optional tagging rules
+        collected: meta information already collected from the database,
+                   if given, the paths are not parsed again, `jobs` and `rules` are not used
 
-    def _iter_records() -> Generator[
-        tuple[int | None, float | None, float | None, str | None, int | None]
-    ]:
-        for cell, path in records:
-            meta_info = extract_meta_info_from_path(path)
-            if meta_info.mnemonic:
-                density, material = define_material_number_and_density(
-                    _materials_index,
-                    meta_info,
-                    path,
-                )
-                yield material, density, meta_info.factor, meta_info.rwcl, cell
+    Raises:
+        ValueError: if `collected` contains malformed tags.
+    """
+    _materials_index = _load_materials_index(materials_index)
+    if collected is None:
+        cells, paths = _load_cells_paths(con)
+        meta_info = extract_path_meta_info(paths, _materials_index, jobs, rules=rules)
+        getLogger().debug("Tags parsing cache: %s", meta_cache_info())
+    else:
+        collected.check_malformed()
+        cells, paths = collected.cells, collected.paths
+        meta_info = resolve_meta_info(collected.meta_info, _materials_index, paths)
+    tagged = meta_info["mnemonic"].notna().to_numpy()
+    # the cells without materials are not updated
+    records = zip(
+        meta_info["material_number"].to_numpy()[tagged].astype(int).tolist(),
+        meta_info["density"].to_numpy()[tagged].tolist(),
+        _to_sql_values(meta_info["factor"].to_numpy()[tagged]),
+        meta_info["rwcl"].to_numpy()[tagged].tolist(),
+        cells[tagged].tolist(),
+        strict=True,
+    )
 
     con.executemany(
         """
@@ -67,40 +149,217 @@ def save_meta_info_from_paths(con: sq.Connection, materials_index: str) -> None:
             rwcl = ?
         where cell = ?
         """,
-        _iter_records(),
+        records,
     )
     con.commit()
+    meta_info.index = pd.Index(cells, name="cell")
+    save_cells_index(con, meta_info)
+
+
+def save_material_numbers(con: sq.Connection, path_info: pd.DataFrame) -> None:
+    """Update material numbers of cells in database and the material index of cells.
+
+    Used after merging or renumbering of materials, to keep the database
+    consistent with the tagged MCNP model.
+
+    Args:
+        con: connection to database
+        path_info: table like :func:`load_path_info` with new material numbers
+    """
+    numbers = path_info["material_number"]
+    con.executemany(
+        "update cells set material = ? where cell = ?",
+        zip(
+            [None if pd.isna(n) else int(n) for n in numbers.tolist()],
+            path_info.index.tolist(),
+            strict=True,
+        ),
+    )
+    con.commit()
+    update_cells_index(con, path_info[["material_number"]])
+
+
+def validate_meta_info(
+    con: sq.Connection,
+    materials_index: str | pd.DataFrame | None,
+    *,
+    rules: RulesMatcher | None = None,
+) -> ValidationReport:
+    """Check meta information for all the cells in the database.
+
+    Args:
+        con: connection to database
+        materials_index: file name of materials index file or already loaded index
+        rules: optional tagging rules
+
+    Returns:
+        The report with all the issues found in tags and material index.
+    """
+    cells, paths = _load_cells_paths(con)
+    _materials_index = _load_materials_index(materials_index)
+    return validate_scenarios(paths, [_materials_index], cells.tolist(), rules=rules)[0]
+
+
+def validate_scenarios_meta_info(
+    con: sq.Connection,
+    material_indexes: Sequence[pd.DataFrame],
+    jobs: int | None = 1,
+    *,
+    rules: RulesMatcher | None = None,
+    collected: CellsMetaInfo | None = None,
+) -> list[ValidationReport]:
+    """Check meta information for all the cells in the database against several indexes.
+
+    Args:
+        con: connection to database
+        material_indexes: loaded material indexes
+        jobs: number of processes to extract meta information, None or 0 - all CPUs
+        rules: optional tagging rules
+        collected: meta information already collected from the database,
+                   if given, the paths are not parsed again, `jobs` and `rules` are not used
+
+    Returns:
+        The reports with all the issues found in tags and every material index.
+    """
+    if collected is None:
+        cells, paths = _load_cells_paths(con)
+        return validate_scenarios(
+            paths,
+            material_indexes,
+            cells.tolist(),
+            rules=rules,
+            jobs=jobs,
+        )
+    return check_meta_info(
+        collected.meta_info,
+        collected.malformed,
+        material_indexes,
+        collected.paths,
+        collected.cells.tolist(),
+    )
+
+
+def create_scenarios_path_info(
+    con: sq.Connection,
+    material_indexes: Sequence[pd.DataFrame],
+    jobs: int | None = 1,
+    *,
+    rules: RulesMatcher | None = None,
+    collected: CellsMetaInfo | None = None,
+) -> list[pd.DataFrame]:
+    """Create tables like :func:`load_path_info` for several material indexes.
+
+    The tags are extracted from the paths once and resolved against every index.
+    The database is not changed: every table presents the values, which would be
+    loaded after :func:`save_meta_info_from_paths` with corresponding index.
+
+    Args:
+        con: connection to database
+        material_indexes: loaded material indexes
+        jobs: number of processes to extract meta information, None or 0 - all CPUs
+        rules: optional tagging rules
+        collected: meta information already collected from the database,
+                   if given, the paths are not parsed again, `jobs` and `rules` are not used
+
+    Returns:
+        The tables ordered by cell number for every material index.
+
+    Raises:
+        ValueError: if `collected` contains malformed tags.
+    """
+    base = load_path_info(con)
+    paths = base["path"].tolist()
+    if collected is None:
+        meta_info = extract_path_meta_info(paths, None, jobs, rules=rules)
+    else:
+        collected.check_malformed()
+        meta_info = collected.meta_info.copy()
+    meta_info.index = base.index
+    not_tagged = meta_info["mnemonic"].isna().to_numpy()
+    result = []
+    for materials in resolve_scenarios(meta_info["mnemonic"], material_indexes, paths):
+        path_info = base.copy()
+        for column, values in (
+            ("material_number", materials["material_number"]),
+            ("density", materials["density"]),
+            ("factor", meta_info["factor"]),
+        ):
+            path_info[column] = pd.to_numeric(base[column].where(not_tagged, values))
+        if path_info["material_number"].notna().all():
+            path_info["material_number"] = path_info["material_number"].astype(int)
+        path_info["rwcl"] = base["rwcl"].where(not_tagged, meta_info["rwcl"])
+        result.append(path_info)
+    return result
+
+
+def _load_materials_index(materials_index: str | pd.DataFrame | None) -> pd.DataFrame:
+    if isinstance(materials_index, pd.DataFrame):
+        return materials_index
+    _materials_index = load_materials_index(materials_index)
+    getLogger().info("Loaded material index from %s", materials_index)
+    return _materials_index
+
+
+def _load_cells_paths(con: sq.Connection) -> tuple[np.ndarray, list[str]]:
+    records = con.execute(
+        """
+        select cell, path from cells order by cell
+        """,
+    ).fetchall()
+    cells = np.fromiter((r[0] for r in records), dtype=np.int64, count=len(records))
+    paths = [r[1] for r in records]
+    return cells, paths
+
+
+def _to_sql_values(values: np.ndarray) -> list[float | None]:
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+PATH_INFO_QUERY = """
+    select
+        cell,
+        volume,
+        xmin,
+        ymin,
+        zmin,
+        xmax,
+        ymax,
+        zmax,
+        material material_number,
+        density,
+        correction factor,
+        rwcl,
+        path
+    from
+        cells
+    order by
+        cell
+"""
+"""Query selecting the rows of :func:`load_path_info` table."""
 
 
 def load_path_info(con: sq.Connection) -> pd.DataFrame:
     """Load 'cells' table from the database.
 
     Args:
-        con: database connection
+        con: connection to database
 
     Returns:
         the loaded table ordered by cell number
     """
-    return pd.read_sql(
-        """
-        select
-            cell,
-            volume,
-            xmin,
-            ymin,
-            zmin,
-            xmax,
-            ymax,
-            zmax,
-            material material_number,
-            density,
-            correction factor,
-            rwcl,
-            path
-        from
-            cells
-        order by
-            cell
-        """,
-        con,
-    ).set_index("cell")
+    return pd.read_sql(PATH_INFO_QUERY, con).set_index("cell")
+
+
+def iter_path_info(con: sq.Connection) -> Iterator[dict[str, Any]]:
+    """Iterate over rows of 'cells' table like in :func:`load_path_info` without loading it.
+
+    Args:
+        con: connection to database
+
+    Yields:
+        the rows as mappings column -> value ordered by cell number
+    """
+    cursor = con.execute(PATH_INFO_QUERY)
+    columns = [d[0] for d in cursor.description]
+    for row in cursor:
+        yield dict(zip(columns, row, strict=True))
@@ -2,10 +2,14 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+import bz2
+import gzip
+import json
 import re
 import shutil
 import sqlite3 as sq
 
+from contextlib import closing
 from pathlib import Path
 
 import pandas as pd
@@ -13,14 +17,17 @@ import pytest
 
 from numpy.testing import assert_array_equal
 
+from mapstp import extract_info, materials_index
+from mapstp.cells_index import query_cells
 from mapstp.cli.runner import __summary__, __version__, mapstp
 from mapstp.materials import load_materials_map
+from mapstp.shared_table import SharedTable
 from mapstp.utils._io import (
     find_first_cell_number,
     find_first_void_cell_number,
     read_mcnp_sections,
 )
-from mapstp.utils._re import MATERIAL_PATTERN, VOID_CELL_START_PATTERN
+from mapstp.utils._re import CELL_START_PATTERN, MATERIAL_PATTERN, VOID_CELL_START_PATTERN
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
@@ -117,13 +124,42 @@ def test_commenting1_to_stdout(cd_tmpdir, runner, data):
 def test_commenting_with_sql_to_stdout(cd_tmpdir, runner, data):
     assert cd_tmpdir == Path.cwd()
     mcnp = data / "test1.i"
+    sql = cd_tmpdir / "test1.sqlite"
+    shutil.copy(data / sql.name, sql)
     result = runner.invoke(
         mapstp,
-        args=["--sql", str(mcnp.with_suffix(".sqlite")), str(mcnp)],
+        args=["--sql", str(sql), str(mcnp)],
         catch_exceptions=False,
     )
     assert result.exit_code == 0, result.output
     assert "$ stp: test1/Component1/Твердое тело1" in result.output
+    with closing(sq.connect(sql)) as con:
+        tables = {row[0] for row in con.execute("select name from sqlite_master")}
+    assert "cells_index" in tables
+
+
+@pytest.mark.parametrize(
+    "sql,loaded", [("test1.sqlite", False), ("test-extract-info.sqlite", True)]
+)
+def test_default_index_is_loaded_for_mnemonics_only(  # noqa: PLR0913
+    cd_tmpdir, runner, data, monkeypatch, sql, loaded
+):
+    assert cd_tmpdir == Path.cwd()
+    shutil.copy(data / sql, sql)
+    calls = []
+
+    def default_materials_index():
+        calls.append(1)
+        return original()
+
+    original = materials_index.default_materials_index
+    monkeypatch.setattr(materials_index, "default_materials_index", default_materials_index)
+    mcnp = data / Path(sql).with_suffix(".i")
+    result = runner.invoke(
+        mapstp, args=["--check", "--sql", sql, str(mcnp)], catch_exceptions=False
+    )
+    assert result.exit_code == 0, result.output
+    assert bool(calls) is loaded
 
 
 # noinspection SqlResolve
@@ -274,6 +310,213 @@ def test_info_assignment_with_sql(runner, cd_tmpdir, data):
     assert len(first_void_lines) == 6
 
 
+def test_check(runner, cd_tmpdir, data):
+    assert cd_tmpdir == Path.cwd()
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    mcnp = data / "test-extract-info.i"
+    result = runner.invoke(
+        mapstp,
+        args=["--check", "--sql", str(sql), str(mcnp)],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    assert "No issues found." in result.output
+    with sq.connect(sql) as con:
+        assert con.execute("select count(*) from cells where material not null").fetchone()[0] == 0
+
+
+def test_check_with_errors(runner, cd_tmpdir, data):
+    assert cd_tmpdir == Path.cwd()
+    output = Path("test-extract-info-prepared.i")
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    with sq.connect(sql) as con:
+        con.execute("update cells set path = path || ' [m-Unknown]' where cell > 2002")
+    mcnp = data / "test-extract-info.i"
+    result = runner.invoke(
+        mapstp,
+        args=["--check", "--sql", str(sql), str(mcnp)],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 1, result.output
+    assert "unknown mnemonic 'Unknown': 2 cell(s): 2003, 2004" in result.output
+    result = runner.invoke(
+        mapstp,
+        args=["--output", str(output), "--sql", str(sql), str(mcnp)],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 1, result.output
+    assert not output.exists(), "Nothing should be written on invalid tags"
+
+
+def test_rules(runner, cd_tmpdir, data):
+    assert cd_tmpdir == Path.cwd()
+    output = Path("tagged.i")
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    rules = Path("rules.txt")
+    rules.write_text("Component2 [m-Inconel718]\n*/Component4*/* [m-LH r-X]\n", encoding="utf8")
+    mcnp = data / "test-extract-info.i"
+    result = runner.invoke(
+        mapstp,
+        args=["--output", str(output), "--rules", str(rules), "--sql", str(sql), str(mcnp)],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    with sq.connect(sql) as con:
+        actual = {r[0]: r[1:] for r in con.execute("select cell, material, rwcl from cells")}
+    assert actual[2000] == (None, None)
+    assert actual[2001] == (305, None)
+    assert actual[2003] == (305, "X"), "inline tag overrides material from rule"
+
+
+def test_scenarios(runner, cd_tmpdir, data, materials):
+    assert cd_tmpdir == Path.cwd()
+    output = Path("tagged.i")
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    for name, factor in (("base", 1.0), ("light", 0.5)):
+        index = materials.reset_index().rename(columns={"density": "eff.density, g/cm3"})
+        index["eff.density, g/cm3"] = index["eff.density, g/cm3"].astype(float) * factor
+        index.to_excel(f"{name}.xlsx", index=False)
+    mcnp = data / "test-extract-info.i"
+    result = runner.invoke(
+        mapstp,
+        args=[
+            "--output",
+            str(output),
+            "-m",
+            "base.xlsx",
+            "-m",
+            "light.xlsx",
+            "--sql",
+            str(sql),
+            str(mcnp),
+        ],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    densities = {}
+    for name in ("base", "light"):
+        assert Path(f"tagged-{name}.i").exists()
+        assert Path(f"test-extract-info-cells-{name}.xlsx").exists()
+        with sq.connect(f"test-extract-info-{name}.sqlite") as con:
+            densities[name] = con.execute(
+                "select density from cell_info where cell = 2003",
+            ).fetchone()[0]
+            assert query_cells(con, "mnemonic", "Inconel718") == [2003]
+            material = int(materials.loc["Inconel718", "number"])
+            assert query_cells(con, "material", material) == [2003]
+    assert densities["light"] == pytest.approx(0.5 * densities["base"])
+    with sq.connect(sql) as con:
+        assert con.execute("select count(*) from cells where material not null").fetchone()[0] == 0
+    lines = Path("tagged-light.i").read_text(encoding="utf8").split("\n")
+    assert len(list(extract_stp_comment_lines(lines))) == 5
+
+
+def test_materials_index_overlay(runner, cd_tmpdir, data):
+    assert cd_tmpdir == Path.cwd()
+    output = Path("tagged.i")
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    Path("overlay.csv").write_text("mnemonic,number,density\nInconel718,306,1.0\n", encoding="utf8")
+    result = runner.invoke(
+        mapstp,
+        args=[
+            "-o",
+            str(output),
+            "-M",
+            "overlay.csv",
+            "--sql",
+            str(sql),
+            str(data / "test-extract-info.i"),
+        ],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    assert "2003 306 -0.5" in read_mcnp_sections(output).cells
+
+
+@pytest.mark.parametrize("overlays", [[], ["-m", "base.csv", "-m", "light.csv"]])
+def test_paths_are_parsed_once(runner, cd_tmpdir, data, monkeypatch, overlays):
+    assert cd_tmpdir == Path.cwd()
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    for name, density in (("base", 8.0), ("light", 1.0)):
+        Path(f"{name}.csv").write_text(
+            f"mnemonic,number,density\nInconel718,306,{density}\n",
+            encoding="utf8",
+        )
+    parsed: list[str] = []
+    original = extract_info.extract_meta_info_from_path
+
+    def counting(path, *args, **kwargs):
+        parsed.append(path)
+        return original(path, *args, **kwargs)
+
+    monkeypatch.setattr(extract_info, "extract_meta_info_from_path", counting)
+    result = runner.invoke(
+        mapstp,
+        args=["-o", "tagged.i", "--sql", str(sql), *overlays, str(data / "test-extract-info.i")],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    with closing(sq.connect(sql)) as con:
+        paths = [row[0] for row in con.execute("select path from cells order by cell")]
+    assert parsed == paths
+
+
+def test_renumber_materials(runner, cd_tmpdir, data):
+    assert cd_tmpdir == Path.cwd()
+    output = Path("tagged.i")
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    materials = Path("materials.txt")
+    materials.write_text("m305 1001.31c 2 8016.31c 1\n", encoding="cp1251")
+    args = ["--output", str(output), "--sql", str(sql), str(data / "test-extract-info.i")]
+    result = runner.invoke(mapstp, args=["--renumber-materials", *args])
+    assert result.exit_code != 0
+    assert "The `--materials` option is required" in result.output
+    result = runner.invoke(
+        mapstp,
+        args=["--materials", str(materials), "--merge-materials", "--renumber-materials", *args],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    sections = read_mcnp_sections(output)
+    assert "2003 1 -4.11" in sections.cells
+    assert sections.cards
+    assert "m1 1001.31c 2 8016.31c 1" in sections.cards
+    assert "m305" not in sections.cards
+    with closing(sq.connect(sql)) as con:
+        assert con.execute("select material from cells where cell = 2003").fetchone() == (1,)
+        assert query_cells(con, "material", 1) == [2003]
+        assert query_cells(con, "material", 305) == []
+
+
+def test_renumber_materials_with_materials_set_in_model(runner, cd_tmpdir, data):
+    assert cd_tmpdir == Path.cwd()
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    mcnp = Path("model.i")
+    lines = (data / "test-extract-info.i").read_text(encoding="cp1251").split("\n")
+    i, match = next(
+        (i, match) for i, line in enumerate(lines) if (match := CELL_START_PATTERN.match(line))
+    )
+    cell = match["number"]
+    lines[i] = lines[i][: match.start("material")] + "7 -1.0" + lines[i][match.end("material") :]
+    mcnp.write_text("\n".join(lines), encoding="cp1251")
+    materials = Path("materials.txt")
+    materials.write_text("m305 1001.31c 2 8016.31c 1\n", encoding="cp1251")
+    result = runner.invoke(
+        mapstp,
+        args=["--materials", str(materials), "--renumber-materials", "--sql", str(sql), str(mcnp)],
+    )
+    assert result.exit_code != 0
+    assert f"already have materials ({cell})" in result.output
+
+
 @pytest.mark.skip(reason="STP")
 @pytest.mark.parametrize(
     "mcnp,expected",
@@ -450,5 +693,60 @@ def check_materials(materials, number_of_materials):
     assert material_1_first_row.startswith("5010.31d")
 
 
+def test_cell_table_outputs(runner, cd_tmpdir, data, monkeypatch):
+    assert cd_tmpdir == Path.cwd()
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    args = ["--output", "tagged.i", "--sql", str(sql), "--csv", "cells.csv"]
+    args += ["--shared-table", "shared", "--ndjson", "cells.ndjson"]
+    mcnp = str(data / "test-extract-info.i")
+    result = runner.invoke(mapstp, args=[*args, mcnp], catch_exceptions=False)
+    assert result.exit_code == 0, result.output
+    cells = pd.read_csv("cells.csv", index_col="cell")
+    assert cells.columns.tolist() == [
+        "material_number",
+        "density",
+        "factor",
+        "rwcl",
+        "volume",
+        "path",
+    ]
+    assert cells.loc[2003, "material_number"] == 305
+    shared = SharedTable("shared").to_frame()
+    assert shared.loc[2003, "material_number"] == 305
+    assert shared["path"].tolist() == cells["path"].tolist()
+    with Path("cells.ndjson").open(encoding="utf-8") as stream:
+        records = [json.loads(line) for line in stream]
+    assert [r["cell"] for r in records] == cells.index.tolist()
+    assert [r["path"] for r in records] == cells["path"].tolist()
+    record = records[cells.index.get_loc(2003)]
+    assert record["material"] == 305
+    assert record["bbox"] is None or len(record["bbox"]) == 6
+    monkeypatch.setattr("mapstp.cli.runner.find_spec", lambda _: None)
+    result = runner.invoke(mapstp, args=[*args, "--feather", "cells.feather", mcnp])
+    assert result.exit_code != 0
+    assert "The --feather output requires pyarrow" in result.output
+
+
+def test_compressed_outputs(runner, cd_tmpdir, data):
+    assert cd_tmpdir == Path.cwd()
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    args = ["--sql", str(sql), "--compression-level", "1", "--csv", "cells.csv.xz"]
+    args += ["--output", "tagged.i.gz", "--ndjson", "cells.ndjson.bz2"]
+    result = runner.invoke(
+        mapstp,
+        args=[*args, str(data / "test-extract-info.i")],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    with gzip.open("tagged.i.gz", "rt", encoding="utf8") as stream:
+        assert "2003 305 -4.11" in stream.read()
+    cells = pd.read_csv("cells.csv.xz", index_col="cell")
+    assert cells.loc[2003, "material_number"] == 305
+    with bz2.open("cells.ndjson.bz2", "rt", encoding="utf-8") as stream:
+        assert len(stream.readlines()) == len(cells)
+
+
 if __name__ == "__main__":
     pytest.main()
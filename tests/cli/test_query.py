@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import shutil
+
+from pathlib import Path
+
+from mapstp.cli.query import mapstp_cells
+from mapstp.cli.runner import mapstp
+
+
+def test_query(runner, cd_tmpdir, data):
+    assert cd_tmpdir == Path.cwd()
+    sql = Path("test-extract-info.sqlite")
+    shutil.copy(data / sql, sql)
+    mcnp = data / "test-extract-info.i"
+    result = runner.invoke(
+        mapstp,
+        args=["--output", "tagged.i", "--sql", str(sql), str(mcnp)],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(
+        mapstp_cells,
+        args=[str(sql), "mnemonic", "Inconel718"],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0, result.output
+    assert result.output.split() == ["2003"]
+    result = runner.invoke(mapstp_cells, args=["--list", "material", str(sql)])
+    assert result.exit_code == 0, result.output
+    assert result.output.split() == ["305", "1"]
+    result = runner.invoke(mapstp_cells, args=[str(sql)])
+    assert result.exit_code == 2, result.output
@@ -19,6 +19,21 @@ if TYPE_CHECKING:
     import pandas as pd
 
 
+@pytest.fixture(scope="session", autouse=True)
+def _cache_dir(tmp_path_factory) -> Generator[Path]:
+    """Isolate persistent caches from the user cache directory."""
+    path = tmp_path_factory.mktemp("cache")
+    old = os.environ.get("MAPSTP_CACHE_DIR")
+    os.environ["MAPSTP_CACHE_DIR"] = str(path)
+    try:
+        yield path
+    finally:
+        if old is None:
+            del os.environ["MAPSTP_CACHE_DIR"]
+        else:
+            os.environ["MAPSTP_CACHE_DIR"] = old
+
+
 @pytest.fixture(scope="session")
 def data() -> Path:
     return cast("Path", files("tests").joinpath("data"))
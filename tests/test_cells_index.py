@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import sqlite3 as sq
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mapstp.cells_index import (
+    build_cells_index,
+    list_keys,
+    query_cells,
+    save_cells_index,
+    update_cells_index,
+)
+
+
+@pytest.fixture
+def cells() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "mnemonic": ["SS316", None, "LH", "SS316"],
+            "material_number": [1.0, np.nan, 2.0, 1.0],
+            "rwcl": [None, "A", "A", None],
+        },
+        index=pd.Index([10, 11, 12, 13], name="cell"),
+    )
+
+
+def test_build_cells_index(cells):
+    index = build_cells_index(cells)
+    assert index["mnemonic"].keys() == {"SS316", "LH"}
+    assert index["mnemonic"]["SS316"].tolist() == [10, 13]
+    assert index["material"]["2"].tolist() == [12]
+    assert index["rwcl"]["A"].tolist() == [11, 12]
+
+
+def test_save_and_query_cells_index(cells):
+    with sq.connect(":memory:") as con:
+        save_cells_index(con, cells)
+        assert query_cells(con, "mnemonic", "SS316") == [10, 13]
+        assert query_cells(con, "material", 2) == [12]
+        assert query_cells(con, "rwcl", "B") == []
+        assert list_keys(con, "rwcl") == [("A", 2)]
+        with pytest.raises(ValueError, match="Unknown index kind 'foo'"):
+            query_cells(con, "foo", "A")
+
+
+def test_update_cells_index(cells):
+    with sq.connect(":memory:") as con:
+        save_cells_index(con, cells)
+        update_cells_index(con, cells[["material_number"]].replace({2.0: 5.0}))
+        assert query_cells(con, "material", 2) == []
+        assert query_cells(con, "material", 5) == [12]
+        assert query_cells(con, "mnemonic", "LH") == [12]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+import re
+
 import numpy as np
 import pandas as pd
 import pytest
 
-from mapstp.extract_info import extract_path_info
+from mapstp.extract_info import (
+    clear_meta_cache,
+    collect_meta_info,
+    collect_path_meta_info,
+    extract_meta_info_from_path,
+    extract_path_info,
+    extract_path_meta_info,
+    meta_cache_info,
+    resolve_materials,
+)
 
 
 def test_load_materials_index(materials):
@@ -50,6 +61,29 @@ def test_extract_info(materials, paths, expected, msg):
     assert (actual == _expected).mask(isna).all(axis=None), msg
 
 
+def test_extract_info_with_void_cells(materials):
+    paths = ["aaa [m-LH]/bbb", "aaa/bbb [f-0.5]", "aaa [m-Be]/ccc", "aaa [m-LH]/ccc [m-void]"]
+    actual = extract_path_info(paths, materials)
+    assert actual["material_number"].tolist()[:3:2] == [2, 4]
+    assert actual["material_number"].isna().tolist() == [False, True, False, True]
+    assert actual["density"].isna().tolist() == [False, True, False, True]
+    assert actual["factor"].tolist()[1] == 0.5
+
+
+def test_empty_mnemonic_is_not_tagged(materials):
+    paths = ["aaa [m-]/bbb", "aaa [m-LH]/bbb [m-]", "aaa [m-LH]/ccc"]
+    actual = extract_path_info(paths, materials)
+    assert actual["material_number"].isna().tolist() == [True, True, False]
+    assert collect_meta_info(paths)["mnemonic"].isna().tolist() == [True, True, False]
+
+
+def test_resolve_materials_keeps_index(materials):
+    mnemonics = pd.Series(["LH", None, "LH"], index=[10, 11, 12], dtype=object)
+    actual = resolve_materials(mnemonics, materials, ["a", "b", "c"])
+    assert actual.index.tolist() == [10, 11, 12]
+    assert actual.loc[12, "material_number"] == 2
+
+
 @pytest.mark.parametrize(
     "paths,exception,msg",
     [
@@ -99,5 +133,51 @@ def test_extract_info_with_negative_density(materials, paths, exception, msg):
         extract_path_info(paths, materials_with_negative_density)
 
 
+def test_meta_cache():
+    clear_meta_cache()
+    paths = [f"aaa [m-LH f-0.9]/bbb{i} [r-PBS55]" for i in range(10)]
+    collect_meta_info(paths)
+    info = meta_cache_info()
+    assert info.misses == 2
+    assert info.hits == 18
+    assert info.currsize == 2
+
+
+def test_meta_cache_keeps_path_in_errors():
+    clear_meta_cache()
+    for path in ["aaa [m]/bbb", "ccc [m]/ddd"]:
+        with pytest.raises(ValueError, match=re.escape(f"On path {path}")):
+            extract_meta_info_from_path(path)
+
+
+def test_parallel_extraction_is_same_as_serial(materials, paths_ei):
+    paths = [
+        p.replace("Component4", f"Component4 [f-0.{i}]")
+        if i % 2
+        else p.replace("Component1", "[m-LH]")
+        for i in range(20)
+        for p in paths_ei
+    ]
+    expected = extract_path_meta_info(paths, materials)
+    actual = extract_path_meta_info(paths, materials, jobs=3, chunk_size=7)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_parallel_extraction_errors(materials):
+    paths = ["aaa [m-LH]/bbb"] * 10 + ["aaa [m-Unknown]/bbb"]
+    with pytest.raises(KeyError, match="The mnemonic 'Unknown'"):
+        extract_path_meta_info(paths, materials, jobs=2, chunk_size=4)
+
+
+def test_parallel_collection_is_same_as_serial():
+    paths = [f"aaa [m-LH f-0.{i}]/bbb [r-{i}]" for i in range(10)]
+    paths[3] = "aaa [m]/bbb"
+    paths[8] = "aaa [f-x]/bbb"
+    expected = collect_path_meta_info(paths)
+    actual = collect_path_meta_info(paths, jobs=2, chunk_size=4)
+    pd.testing.assert_frame_equal(actual[0], expected[0])
+    assert actual[1] == expected[1] == [(3, "m"), (8, "f-x")]
+
+
 if __name__ == "__main__":
     pytest.main()
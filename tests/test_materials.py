@@ -1,8 +1,22 @@
 from __future__ import annotations
 
+import gzip
+import io
+import lzma
+import math
+import zipfile
+
+import pandas as pd
 import pytest
 
-from mapstp.materials import drop_material_cards, load_materials_map
+from mapstp.materials import (
+    compact_used_materials,
+    composition_hash,
+    drop_material_cards,
+    load_materials_map,
+    load_materials_map_from_bytes,
+    load_materials_map_from_stream,
+)
 
 
 def test_load_materials_map(data):
@@ -19,6 +33,99 @@ def test_load_materials_map(data):
     assert 400 in materials_map
 
 
+@pytest.mark.parametrize("suffix", [".zip", ".gz", ".xz"])
+def test_load_compressed_materials_map(data, tmp_path, suffix):
+    source = data / "materials-1.txt"
+    path = tmp_path / f"materials{suffix}"
+    if suffix == ".zip":
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.write(source, "materials-1.txt")
+            archive.write(data / "111.txt", "111.txt")
+        actual = load_materials_map(path, "materials-1.txt")
+    else:
+        compress = gzip.compress if suffix == ".gz" else lzma.compress
+        path.write_bytes(compress(source.read_bytes()))
+        actual = load_materials_map(path)
+    assert actual == load_materials_map(source)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        (
+            b"m1 1001.31c 1\r\nc x\r\n      1002.31c 2\r\nC\r\nmode n",
+            {1: "m1 1001.31c 1\n      1002.31c 2\n"},
+        ),
+        (b"c head\nm2\n\n  c tail", {2: "m2\n\n"}),
+        (b"  m3 $ c\n      1\nmt3 lwtr\n      2\nm4", {3: "  m3 $ c\n      1\n", 4: "m4\n"}),
+        (b"     m5\nc m6\ncm7", {}),
+    ],
+)
+def test_load_materials_map_from_bytes(text, expected):
+    assert load_materials_map_from_bytes(text) == expected
+    assert load_materials_map_from_stream(io.StringIO(text.decode("cp1251"))) == expected
+
+
+def test_load_materials_map_from_stream_with_not_cp1251_text():
+    text = "c 水\nm1 1001.31c 1 $ вода, 水\nc 水\n      8016.31c 2\n"
+    assert load_materials_map_from_stream(io.StringIO(text)) == {
+        1: "m1 1001.31c 1 $ вода, 水\n      8016.31c 2\n",
+    }
+
+
+@pytest.mark.parametrize(
+    "text,msg",
+    [
+        (b"m1\n  1001.31c 1\nc\nm1 1002.31c 1\n", "Material number 1 is duplicated"),
+        (b"m1 1001.31c 1\nm00\n", "Wrong material number 0 found"),
+    ],
+)
+def test_load_bad_materials_map(text, msg):
+    with pytest.raises(ValueError, match=msg):
+        load_materials_map_from_bytes(text)
+
+
+@pytest.mark.parametrize(
+    "a,b,expected",
+    [
+        (
+            "m1 1001.31c 2 8016.31c 1 $ water",
+            "m7 $ other\nc x\n  8016.31C 0.5\n     1001.31c 1",
+            True,
+        ),
+        ("m1 1001.31c 1 nlib = 31c", "m2 1001.31c 1 nlib=31c", True),
+        ("m1 1001.31c 1 nlib=31c", "m2 1001.31c 1", False),
+        ("m1 1001.31c 2 8016.31c 1", "m2 1001.31c 1 8016.31c 1", False),
+        ("m1 1001.31c -2 8016.31c 1", "m2 1001.31c -4 8016.31c 2", False),
+        ("m1 1001.31c 2 8016.31c 1", "m2 1001.31c -2 8016.31c -1", False),
+        ("m1 1001.31c -2 8016.31c -1", "m2 8016.31c -0.5 1001.31c -1", True),
+    ],
+)
+def test_composition_hash(a, b, expected):
+    assert (composition_hash(a) == composition_hash(b)) is expected
+
+
+@pytest.mark.parametrize(
+    "renumber,expected_numbers,expected_cards",
+    [
+        (False, [9.0, 1.0, 1.0, math.nan, 5.0], ["m1", "m5", "m9"]),
+        (True, [3.0, 1.0, 1.0, math.nan, 2.0], ["m1", "m2", "m3"]),
+    ],
+)
+def test_compact_used_materials(renumber, expected_numbers, expected_cards):
+    materials_map = {
+        1: "m1 1001.31c 2 8016.31c 1\n",
+        7: "m7 8016.31c 1 1001.31c 2\n",
+        9: "m9 26000.31c -1\n",
+    }
+    path_info = pd.DataFrame({"material_number": [9, 7, 1, None, 5]}, index=[1, 2, 3, 4, 5])
+    actual, cards = compact_used_materials(materials_map, path_info, renumber=renumber)
+    text = "".join(cards)
+    assert actual["material_number"].tolist() == pytest.approx(expected_numbers, nan_ok=True)
+    assert [line.split()[0] for line in text.split("\n") if line.startswith("m")] == expected_cards
+    assert path_info["material_number"].tolist()[0] == 9, "The input should not be changed"
+
+
 def test_filter_material_cards(data):
     materials = data / "materials-1.txt"
     filtered_lines = list(drop_material_cards(materials.read_text(encoding="cp1251").split("\n")))
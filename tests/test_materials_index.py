@@ -1,10 +1,181 @@
 from __future__ import annotations
 
+import json
+import os
+import shutil
+import sqlite3 as sq
+
+import pandas as pd
 import pytest
 
-from mapstp.materials_index import load_materials_index
+from mapstp import materials_index
+from mapstp.extract_info import resolve_materials
+from mapstp.materials_index import (
+    DEFAULT_INDEX,
+    DEFAULT_INDEX_SOURCE,
+    PACKAGE_DATA,
+    compile_materials_index,
+    default_materials_index,
+    load_materials_index,
+    merge_materials_indexes,
+)
+from mapstp.validation import validate_paths
 
 
 def test_load_materials_index_bad_path():
     with pytest.raises(FileNotFoundError):
         load_materials_index("not_existing")
+
+
+def test_materials_index_is_cached(tmp_path, monkeypatch):
+    path = tmp_path / "index.xlsx"
+    shutil.copy(PACKAGE_DATA / "default-material-index.xlsx", path)
+    expected = load_materials_index(str(path))
+    monkeypatch.setattr(materials_index, "_read_excel", _fail)
+    actual = load_materials_index(str(path))
+    pd.testing.assert_frame_equal(actual, expected)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(AssertionError, match="should not be read"):
+        load_materials_index(str(path))
+    monkeypatch.undo()
+    pd.testing.assert_frame_equal(load_materials_index(str(path)), expected)
+
+
+def test_numeric_mnemonic_is_same_in_cache(tmp_path, monkeypatch):
+    path = tmp_path / "index.xlsx"
+    pd.DataFrame(
+        {"mnemonic": ["SS316", 316], "number": [1, 2], "eff.density, g/cm3": [7.9, 8.0]},
+    ).to_excel(path, index=False)
+    cold = load_materials_index(str(path))
+    assert cold.index.tolist() == ["SS316", "316"]
+    monkeypatch.setattr(materials_index, "_read_excel", _fail)
+    warm = load_materials_index(str(path))
+    pd.testing.assert_frame_equal(warm, cold)
+
+
+def test_materials_index_without_cache(tmp_path, monkeypatch, caplog):
+    not_dir = tmp_path / "file"
+    not_dir.touch()
+    monkeypatch.setenv("MAPSTP_CACHE_DIR", str(not_dir))
+    actual = load_materials_index(str(DEFAULT_INDEX_SOURCE))
+    assert "Cannot use materials index cache" in caplog.text
+    assert actual.loc["Be", "number"] == 4
+
+
+def test_default_index_is_compiled_from_source(tmp_path):
+    target = tmp_path / "index.tsv"
+    compile_materials_index(DEFAULT_INDEX_SOURCE, target)
+    assert target.read_text(encoding="utf-8") == DEFAULT_INDEX.read_text(encoding="utf-8"), (
+        "Run tools/compile-default-index to update the default index"
+    )
+    pd.testing.assert_frame_equal(
+        load_materials_index(),
+        load_materials_index(str(DEFAULT_INDEX_SOURCE)),
+    )
+
+
+def test_default_index_is_loaded_once(monkeypatch):
+    default_materials_index.cache_clear()
+    calls = []
+    monkeypatch.setattr(
+        materials_index,
+        "_read_csv",
+        lambda *args, **_: calls.append(args) or iter([("Be", 4, 1.82)]),
+    )
+    first = load_materials_index()
+    first.loc["Be", "number"] = 0
+    second = load_materials_index()
+    assert len(calls) == 1
+    assert second.loc["Be", "number"] == 4
+    default_materials_index.cache_clear()
+
+
+@pytest.fixture(scope="module")
+def default_index():
+    return load_materials_index()
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".tsv", ".sqlite", ".json", ".toml"])
+def test_text_and_sqlite_formats(tmp_path, default_index, suffix):
+    path = tmp_path / f"index{suffix}"
+    table = default_index.reset_index()
+    if suffix in {".csv", ".tsv"}:
+        table = table.rename(columns={"density": "eff.density, g/cm3"})
+        table.to_csv(path, sep="," if suffix == ".csv" else "\t", index=False)
+    elif suffix == ".sqlite":
+        with sq.connect(path) as con:
+            table.to_sql("materials_index", con, index=False)
+        con.close()
+    else:
+        records = table.to_dict(orient="records")
+        if suffix == ".json":
+            path.write_text(json.dumps(records), encoding="utf-8")
+        else:
+            text = "".join(
+                f'[[materials]]\nmnemonic = "{r["mnemonic"]}"\n'
+                f"number = {r['number']}\ndensity = {r['density']}\n"
+                for r in records
+            )
+            path.write_text(text, encoding="utf-8")
+    pd.testing.assert_frame_equal(load_materials_index(str(path)), default_index)
+
+
+def test_csv_with_missing_values(tmp_path):
+    path = tmp_path / "index.csv"
+    path.write_text(
+        "mnemonic,number,density,comment\nBe,4,1.82,x\nnew,,,\n,5,1.0,\n", encoding="utf-8"
+    )
+    actual = load_materials_index(str(path))
+    assert actual.index.tolist() == ["Be", "new"]
+    assert actual.loc["Be", "number"] == 4
+    assert actual.loc["new"].isna().all()
+
+
+def test_bad_columns(tmp_path):
+    path = tmp_path / "index.csv"
+    path.write_text("mnemonic,number\nBe,4\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Density column is not found"):
+        load_materials_index(str(path))
+
+
+def test_layered_index(tmp_path, default_index):
+    path = tmp_path / "overlay.csv"
+    path.write_text("mnemonic,number,density\nBe,4,1.5\nnew,1000,-1.0\n", encoding="utf-8")
+    actual = load_materials_index([None, str(path)])
+    assert actual.index.is_unique
+    assert len(actual) == len(default_index) + 1
+    assert actual.loc["Be", "density"] == 1.5
+    assert actual.loc["Be", "layer"] == str(path)
+    assert actual.loc["W", "layer"] == "default"
+    assert actual.loc["W", "density"] == default_index.loc["W", "density"]
+    mnemonics = pd.Series(["Be", "new"], index=[1, 2])
+    with pytest.raises(ValueError, match=r"'new' in the material index \(layer '.*overlay.csv'\)"):
+        resolve_materials(mnemonics, actual, ["a", "b"])
+
+
+def test_merge_keeps_duplicates_inside_layer():
+    base = pd.DataFrame(
+        {"number": [1, 2, 3], "density": [1.0, 2.0, 3.0]},
+        index=pd.Index(["A", "B", "B"], name="mnemonic"),
+    )
+    overlay = pd.DataFrame(
+        {"number": [4, 5, 6], "density": [4.0, 5.0, 6.0]},
+        index=pd.Index(["A", "C", "C"], name="mnemonic"),
+    )
+    actual = merge_materials_indexes([("base", base), ("overlay", overlay)])
+    assert actual.index.tolist() == ["B", "B", "A", "C", "C"]
+    assert actual["number"].tolist() == [2, 3, 4, 5, 6]
+    assert actual.loc["A", "layer"] == "overlay"
+    report = validate_paths(["a [m-B]/b", "a [m-C]/b"], actual)
+    assert report.issues["issue"].tolist() == ["duplicated mnemonic in material index"] * 2
+
+
+def test_merge_no_layers():
+    with pytest.raises(ValueError, match="At least one material index is required"):
+        merge_materials_indexes([])
+
+
+def _fail(_path):
+    msg = "The Excel file should not be read"
+    raise AssertionError(msg)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+import zipfile
+
+import pytest
+
+from mapstp import materials_library
+from mapstp.materials import load_materials_map
+from mapstp.materials_index import PACKAGE_DATA
+from mapstp.materials_library import (
+    INDEX_FILE_NAME,
+    LazyMaterials,
+    MaterialsLibrary,
+    MaterialsText,
+)
+from mapstp.utils import cache_dir
+
+
+@pytest.mark.parametrize("name", ["materials-1.txt", "111.txt", "tnes-materials.txt"])
+def test_library_is_same_as_materials_map(data, name):
+    expected = load_materials_map(data / name)
+    library = MaterialsLibrary(data / name)
+    assert len(library) == len(expected)
+    assert dict(library) == expected
+    assert library.read([*expected, 1_000_000]) == expected
+
+
+def test_materials_text(data):
+    text = (data / "materials-1.txt").read_bytes()
+    materials = MaterialsText(text, cache_size=1)
+    expected = load_materials_map(data / "materials-1.txt")
+    assert materials[400] == expected[400]
+    assert materials.cached_numbers == [400]
+    assert materials.read([1, 400, 2]) == {1: expected[1], 400: expected[400]}
+    assert len(materials.cached_numbers) == 1
+    assert dict(materials) == expected
+    with pytest.raises(KeyError):
+        materials[2]
+    assert not MaterialsText(text, cache_size=0).read([1])[1].startswith("c")
+
+
+def test_lazy_materials_is_abstract():
+    with pytest.raises(TypeError, match="_read_chunks"):
+        LazyMaterials({})
+
+
+def test_packaged_library(tmp_path):
+    with zipfile.ZipFile(PACKAGE_DATA / "materials.txt.zip") as archive:
+        archive.extractall(tmp_path)
+    expected = load_materials_map(tmp_path / "materials.txt")
+    library = MaterialsLibrary(PACKAGE_DATA / "materials.txt.zip")
+    assert library.keys() == expected.keys()
+    numbers = sorted(expected)[::50]
+    assert library.read(numbers) == {n: expected[n] for n in numbers}
+    assert library[numbers[-1]] == expected[numbers[-1]]
+    assert (
+        MaterialsLibrary(PACKAGE_DATA / "materials.txt.zip", "materials.txt").keys()
+        == library.keys()
+    )
+
+
+def test_index_is_persistent_and_rebuilt_on_change(tmp_path):
+    path = tmp_path / "materials.txt"
+    path.write_text("m1 1001.31c 1.0\nm2 1002.31c 1.0\n", encoding="cp1251")
+    assert MaterialsLibrary(path).keys() == {1, 2}
+    assert (cache_dir() / INDEX_FILE_NAME).exists()
+    assert MaterialsLibrary(path)[2] == "m2 1002.31c 1.0\n"
+    path.write_text("c changed\nm3 1003.31c 1.0\n", encoding="cp1251")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    library = MaterialsLibrary(path)
+    assert library.keys() == {3}
+    assert library[3] == "m3 1003.31c 1.0\n"
+
+
+def test_parsed_materials_are_cached(tmp_path, monkeypatch):
+    path = tmp_path / "materials.txt"
+    path.write_text("c x\nm2 1002.31c 1.0\nc y\nm1 1001.31c 1.0\n", encoding="cp1251")
+    expected = {2: "m2 1002.31c 1.0\n", 1: "m1 1001.31c 1.0\n"}
+    assert load_materials_map(path) == expected
+    monkeypatch.setattr(materials_library, "scan_material_spans", _fail)
+    actual = load_materials_map(path)
+    assert actual == expected
+    assert list(actual) == [2, 1], "the library order should be preserved"
+
+
+def test_cache_dir_is_not_available(tmp_path, monkeypatch, caplog):
+    not_dir = tmp_path / "file"
+    not_dir.touch()
+    monkeypatch.setenv("MAPSTP_CACHE_DIR", str(not_dir))
+    path = tmp_path / "materials.txt"
+    path.write_text("m1 1001.31c 1.0\n", encoding="cp1251")
+    assert load_materials_map(path) == {1: "m1 1001.31c 1.0\n"}
+    assert "Cannot use materials library index" in caplog.text
+
+
+def _fail(_data):
+    msg = "The library should not be scanned"
+    raise AssertionError(msg)
+
+
+@pytest.mark.parametrize(
+    "text,msg",
+    [
+        ("m1 1001.31c 1.0\nm1 1002.31c 1.0\n", "Material number 1 is duplicated"),
+        ("m0 1001.31c 1.0\n", "Wrong material number 0 found"),
+    ],
+)
+def test_bad_library(tmp_path, text, msg):
+    path = tmp_path / "materials.txt"
+    path.write_text(text, encoding="cp1251")
+    with pytest.raises(ValueError, match=msg):
+        MaterialsLibrary(path)
+
+
+if __name__ == "__main__":
+    pytest.main()
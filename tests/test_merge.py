@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import io
+
 import numpy as np
 import pandas as pd
 import pytest
@@ -12,6 +14,28 @@ def test_merger(data):
     assert sections.cells is not None
 
 
+@pytest.mark.parametrize(
+    "cards",
+    ["m1 1001.31c 1\nmode n", None],
+)
+def test_merge_paths_with_streamed_materials(cards):
+    sections = m.MCNPSections("1 0 -1", "1 so 1", cards)
+    path_info = pd.DataFrame(columns=["material_number", "density", "factor", "volume", "path"])
+    materials = ["  m2 1001.31c 1\n", "m3 $ dummy\n     8016.31c 1\n\n"]
+
+    def _merge(used_materials):
+        output = io.StringIO()
+        m.merge_paths(output, path_info, sections, used_materials)
+        return output.getvalue()
+
+    expected = _merge("".join(materials))
+    assert _merge(iter(materials)) == expected
+    assert "m1 1001.31c" not in expected
+    assert "m3 $ dummy\n     8016.31c 1\n" in expected
+    if cards:
+        assert "m1 1001.31c" in _merge(iter([]))
+
+
 @pytest.mark.parametrize(
     "number,density,factor,expected",
     [
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import random
+import re
+
+import pytest
+
+from mapstp.exceptions import RulesFileError
+from mapstp.extract_info import extract_meta_info_from_path, extract_path_info
+from mapstp.rules import Rule, RulesMatcher, load_rules, parse_rules
+
+
+def _matches(pattern: str, path: str) -> bool:
+    if "*" not in pattern:
+        return pattern in path
+    regex = ".*".join(map(re.escape, pattern.split("*")))
+    return re.fullmatch(regex, path, re.DOTALL) is not None
+
+
+@pytest.mark.parametrize(
+    "pattern,path,expected",
+    [
+        ("Shield", "a/Shield block/b", True),
+        ("Shield", "a/Shie/b", False),
+        ("a/Shield*", "a/Shield block/b", True),
+        ("Shield*", "a/Shield block/b", False),
+        ("*block/b", "a/Shield block/b", True),
+        ("*block", "a/Shield block/b", False),
+        ("a*b*c", "a/b/c", True),
+        ("a*b*c", "a/c/b", False),
+        ("*x*x*", "a/x/b", False),
+        ("*x*x*", "a/x/x", True),
+        ("ab*b", "ab", False),
+        ("ab*b", "abb", True),
+        ("*", "anything", True),
+    ],
+)
+def test_match(pattern, path, expected):
+    matcher = RulesMatcher([Rule(pattern, (("m", "X"),))])
+    assert bool(matcher.match(path)) == expected
+
+
+def test_match_is_same_as_brute_force():
+    rng = random.Random(42)  # noqa: S311
+    alphabet = "ab/"
+
+    def _word(size):
+        return "".join(rng.choice(alphabet) for _ in range(size))
+
+    patterns = []
+    for _ in range(200):
+        parts = [_word(rng.randint(0, 3)) for _ in range(rng.randint(1, 4))]
+        pattern = "*".join(parts)
+        if pattern:
+            patterns.append(pattern)
+    matcher = RulesMatcher([Rule(p, ()) for p in patterns])
+    for _ in range(300):
+        path = _word(rng.randint(0, 10))
+        expected = [i for i, p in enumerate(patterns) if _matches(p, path)]
+        assert matcher.match(path) == expected, path
+
+
+def test_parse_rules():
+    rules = parse_rules(
+        [
+            "# comment",
+            "",
+            "Shield block [m-SS316 f-0.9]",
+            "*/bolt* [r-BLT]",
+        ],
+    )
+    assert rules == [
+        Rule("Shield block", (("m", "SS316"), ("f", "0.9"))),
+        Rule("*/bolt*", (("r", "BLT"),)),
+    ]
+
+
+@pytest.mark.parametrize(
+    "line,msg",
+    [
+        ("Shield block", "Line 1: expected '<pattern> \\[<tags>\\]'"),
+        ("Shield block [m]", "Line 1: malformed tags"),
+        ("Component [f-x]", "Line 1: invalid factor f-x"),
+    ],
+)
+def test_parse_bad_rules(line, msg):
+    with pytest.raises(RulesFileError, match=msg):
+        parse_rules([line])
+
+
+def test_priority_of_rules_and_inline_tags(tmp_path):
+    rules_file = tmp_path / "rules.txt"
+    rules_file.write_text(
+        "comp [m-LH f-0.5 r-A]\ncomp/body* [f-0.7]\n*void* [m-void]\n",
+        encoding="utf8",
+    )
+    rules = load_rules(rules_file)
+    meta_info = extract_meta_info_from_path("comp/body1", rules=rules)
+    assert (meta_info.mnemonic, meta_info.factor, meta_info.rwcl) == ("LH", 0.7, "A")
+    meta_info = extract_meta_info_from_path("comp/body1 [m-Be]", rules=rules)
+    assert (meta_info.mnemonic, meta_info.factor, meta_info.rwcl) == ("Be", 0.7, "A")
+    meta_info = extract_meta_info_from_path("comp/void body", rules=rules)
+    assert meta_info.mnemonic is None
+
+
+def test_extract_path_info_with_rules(materials):
+    rules = RulesMatcher(parse_rules(["Breeder [m-LH]"]))
+    actual = extract_path_info(["a/Breeder/b", "a/Shield/b"], materials, rules=rules)
+    assert actual["material_number"].tolist()[0] == 2
+    assert actual["material_number"].isna().tolist() == [False, True]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import io
+import json
+import sqlite3 as sq
+
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mapstp.save_table import (
+    CELL_TABLE_WRITERS,
+    SQL_INDEXED_COLUMNS,
+    combine_cell_table,
+    create_excel,
+    create_sql,
+    iter_cell_records,
+    typed_cell_table,
+    write_ndjson,
+)
+
+
+def _path_info(size: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "material_number": range(1, size + 1),
+            "density": 1.0,
+            "factor": 1.0,
+            "rwcl": [f"rw{i}" for i in range(size)],
+        },
+    )
+
+
+def test_combine_cell_table_with_volumes(caplog):
+    paths = ["a/b", "a/c", "a/b", "a/d"]
+    volumes_map = {"/a/b": 1.0, "/a/c": 2.0, "/a/e": 3.0}
+    actual = combine_cell_table(paths, _path_info(len(paths)), 10, volumes_map)
+    assert actual.index.tolist() == [10, 11, 12, 13]
+    assert actual["STP path"].tolist() == paths
+    np.testing.assert_array_equal(actual["volume"].to_numpy(), [1.0, 2.0, 1.0, np.nan])
+    assert "Volumes are not found for 1 paths: a/d" in caplog.text
+    assert "No cells are found for 1 paths with volumes: a/e" in caplog.text
+
+
+def test_combine_cell_table_without_volumes(caplog):
+    actual = combine_cell_table(["a/b"], _path_info(1))
+    assert actual["volume"].isna().all()
+    assert not caplog.text
+
+
+@pytest.mark.parametrize(
+    "max_rows, expected_sheets",
+    [
+        (10, ["Cells"]),
+        (3, ["Cells", "Cells_2", "Cells_3"]),
+        (2, ["Cells", "Cells_2", "Cells_3", "Cells_4", "Cells_5"]),
+    ],
+)
+def test_create_excel(tmp_path, max_rows, expected_sheets):
+    paths = ["a/b", "a/c", "a/b", "a/d", "a/e"]
+    cell_info = combine_cell_table(paths, _path_info(len(paths)), volumes_map={"/a/b": 1.0})
+    excel = tmp_path / "cells.xlsx"
+    create_excel(excel, cell_info, max_rows=max_rows)
+    sheets = pd.read_excel(excel, sheet_name=None, index_col="cell")
+    assert list(sheets) == expected_sheets
+    actual = pd.concat(sheets.values())
+    pd.testing.assert_frame_equal(actual, cell_info, check_dtype=False)
+
+
+def test_create_excel_empty(tmp_path):
+    cell_info = combine_cell_table([], _path_info(0))
+    excel = tmp_path / "cells.xlsx"
+    create_excel(excel, cell_info)
+    actual = pd.read_excel(excel, sheet_name="Cells")
+    assert actual.columns.tolist() == ["cell", *cell_info.columns]
+    assert actual.empty
+
+
+def test_create_excel_bad_max_rows(tmp_path):
+    with pytest.raises(ValueError, match="from 2 to"):
+        create_excel(tmp_path / "cells.xlsx", combine_cell_table([], _path_info(0)), max_rows=1)
+
+
+def test_create_sql(tmp_path):
+    paths = ["a/b", "a/c", "a/b", "a/d", "a/e"]
+    cell_info = combine_cell_table(paths, _path_info(len(paths)), volumes_map={"/a/b": 1.0})
+    sql = tmp_path / "cells.sqlite"
+    create_sql(sql, combine_cell_table(paths[:1], _path_info(1)))
+    create_sql(sql, cell_info, chunk_size=2)
+    with closing(sq.connect(sql)) as con:
+        actual = pd.read_sql("select * from cell_info order by cell", con, index_col="cell")
+        indexes = {row[1] for row in con.execute("pragma index_list(cell_info)")}
+    expected = cell_info.rename(columns={"STP path": "stp_path"})
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert indexes == {f"cell_info_{column}" for column in SQL_INDEXED_COLUMNS}
+
+
+def test_typed_cell_table():
+    paths = ["a/b", "a/c"]
+    actual = typed_cell_table(combine_cell_table(paths, _path_info(len(paths))))
+    assert actual["material_number"].dtype == "Int64"
+    assert actual["rwcl"].dtype == "category"
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "feather", "csv"])
+def test_cell_table_writers(tmp_path, output_format):
+    if output_format != "csv":
+        pytest.importorskip("pyarrow")
+    paths = ["a/b", "a/c", "a/b"]
+    cell_info = combine_cell_table(paths, _path_info(len(paths)), volumes_map={"/a/b": 1.0})
+    path = tmp_path / f"cells.{output_format}"
+    CELL_TABLE_WRITERS[output_format](path, cell_info)
+    if output_format == "csv":
+        actual = pd.read_csv(path, index_col="cell")
+    elif output_format == "parquet":
+        actual = pd.read_parquet(path)
+        assert actual["rwcl"].dtype == "category"
+    else:
+        actual = pd.read_feather(path).set_index("cell")
+    pd.testing.assert_frame_equal(actual, cell_info, check_dtype=False, check_categorical=False)
+
+
+def test_write_ndjson():
+    path_info = pd.DataFrame(
+        {
+            "volume": [1.5, np.nan],
+            "xmin": [0.0, None],
+            "ymin": [0.0, None],
+            "zmin": [0.0, None],
+            "xmax": [1.0, None],
+            "ymax": [1.0, None],
+            "zmax": [1.0, None],
+            "material_number": np.array([305, 0]),
+            "density": [7.9, None],
+            "factor": [None, 0.5],
+            "rwcl": ["a", None],
+            "path": ["x/ж", "x/z"],
+        },
+        index=pd.Index([10, 11], name="cell"),
+    )
+    stream = io.StringIO()
+    assert write_ndjson(stream, iter_cell_records(path_info)) == 2
+    lines = stream.getvalue().splitlines()
+    assert json.loads(lines[0]) == {
+        "cell": 10,
+        "material": 305,
+        "density": 7.9,
+        "factor": None,
+        "rwcl": "a",
+        "volume": 1.5,
+        "bbox": [0.0, 0.0, 0.0, 1.0, 1.0, 1.0],
+        "path": "x/ж",
+    }
+    second = json.loads(lines[1])
+    assert second["bbox"] is None
+    assert second["volume"] is None
+    assert second["material"] == 0
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import pickle
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mapstp.shared_table import SharedTable, save_shared_table
+
+
+@pytest.fixture
+def cell_info() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "cell": [1, 2, 3],
+            "material_number": [305, None, 7],
+            "density": [1.5, None, 8.0],
+            "factor": [1.0, 1.0, 0.5],
+            "rwcl": ["a", None, "б"],
+            "volume": [np.nan, 2.0, 3.0],
+            "path": ["x/y", "x/z", ""],
+        },
+        dtype=object,
+    ).set_index("cell")
+
+
+def test_save_and_open(tmp_path, cell_info):
+    save_shared_table(tmp_path, cell_info)
+    table = SharedTable(tmp_path)
+    assert list(table) == ["cell", *cell_info.columns]
+    assert table.rows == 3
+    material_number = table["material_number"]
+    assert isinstance(material_number, np.memmap)
+    assert not material_number.flags.writeable
+    assert material_number.dtype == np.int64
+    assert table.missing("material_number").tolist() == [False, True, False]
+    assert table["density"].dtype == np.float64
+    assert list(table["rwcl"]) == ["a", None, "б"]
+    assert table["path"][1] == "x/z"
+    actual = table.to_frame()
+    assert actual["material_number"].dtype == "Int64"
+    assert actual.loc[1, "material_number"] == 305
+    assert pd.isna(actual.loc[2, "material_number"])
+    assert actual["path"].tolist() == cell_info["path"].tolist()
+    np.testing.assert_array_equal(actual.index, [1, 2, 3])
+
+
+def test_column_kind_does_not_depend_on_values(tmp_path):
+    cell_info = pd.DataFrame(
+        {
+            "cell": [1, 2],
+            "density": [None, None],
+            "rwcl": ["01", "2"],
+            "path": [None, None],
+            "comment": ["1", "x"],
+        },
+        dtype=object,
+    ).set_index("cell")
+    save_shared_table(tmp_path, cell_info)
+    table = SharedTable(tmp_path)
+    assert table["density"].dtype == np.float64
+    assert np.isnan(table["density"]).all()
+    assert list(table["rwcl"]) == ["01", "2"]
+    assert list(table["path"]) == [None, None]
+    assert list(table["comment"]) == ["1", "x"]
+
+
+def test_empty_table(tmp_path, cell_info):
+    save_shared_table(tmp_path, cell_info.iloc[:0])
+    table = SharedTable(tmp_path)
+    assert table.rows == 0
+    assert list(table["path"]) == []
+
+
+def test_incomplete_table(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SharedTable(tmp_path)
+
+
+def _total_volume(table: SharedTable) -> float:
+    return float(np.nansum(table["volume"]))
+
+
+def test_pickled_as_path(tmp_path, cell_info):
+    save_shared_table(tmp_path, cell_info)
+    table = SharedTable(tmp_path)
+    table["volume"]
+    assert str(tmp_path).encode() in pickle.dumps(table)
+    assert len(pickle.dumps(table)) < 1000
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(_total_volume, table).result() == 5.0
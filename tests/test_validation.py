@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mapstp.exceptions import ValidationError
+from mapstp.validation import validate_paths
+
+
+def test_validate_good_paths(materials):
+    report = validate_paths(["aaa [m-LH]/bbb [f-0.9]", "aaa/ccc"], materials)
+    assert report.ok
+    assert report.summary() == "No issues found."
+
+
+def test_validate_collects_all_issues(materials):
+    index = materials.copy()
+    index.loc["Be", "density"] = np.nan
+    index.loc["W", "density"] = -1.0
+    paths = [
+        "aaa [m-Unknown]/bbb",
+        "aaa [m-Unknown]/ccc",
+        "aaa [m-Be]/bbb",
+        "aaa [m-W]/bbb",
+        "aaa [m-LH f--0.5]/bbb",
+        "aaa [m-LH f-x]/bbb",
+        "aaa [m]/bbb",
+        "aaa [m-LH]/bbb",
+    ]
+    report = validate_paths(paths, index, cells=[10, 11, 12, 13, 14, 15, 16, 17])
+    assert not report.ok
+    issues = report.issues.set_index("cell")["issue"].to_dict()
+    assert issues == {
+        10: "unknown mnemonic",
+        11: "unknown mnemonic",
+        12: "missed density for mnemonic",
+        13: "negative density for mnemonic",
+        14: "negative factor",
+        15: "malformed tag",
+        16: "malformed tag",
+    }
+    summary = report.summary()
+    assert "Found 7 issue(s) in 7 cell(s):" in summary
+    assert "unknown mnemonic 'Unknown': 2 cell(s): 10, 11" in summary
+
+
+def test_validation_error(materials):
+    report = validate_paths(["aaa [m-Unknown]/bbb"], materials)
+    with pytest.raises(ValidationError, match="unknown mnemonic 'Unknown'"):
+        raise ValidationError(report)
+
+
+def test_validate_empty_mnemonic(materials):
+    report = validate_paths(["aaa [m-]/bbb", "aaa [m-LH]/bbb [m-]"], materials)
+    assert report.ok, report.summary()
+
+
+def test_validate_duplicated_mnemonics(materials):
+    index = pd.concat([materials, materials.loc[["Be"]]])
+    report = validate_paths(["aaa [m-Be]/bbb", "aaa [m-LH]/bbb", "aaa/ccc"], index)
+    assert report.issues[["cell", "issue", "value"]].to_numpy().tolist() == [
+        [0, "duplicated mnemonic in material index", "Be"],
+    ]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from functools import partial
+
+import pandas as pd
+import pytest
+
+from mapstp import workflow
+from mapstp.exceptions import ValidationError
+from mapstp.extract_info import collect_path_meta_info, extract_path_info
+from mapstp.materials_index import DEFAULT_INDEX
+from mapstp.workflow import create_path_info
+
+
+def test_create_path_info_in_parallel(data, materials, paths_ei, monkeypatch):
+    monkeypatch.setattr(
+        workflow, "collect_path_meta_info", partial(collect_path_meta_info, chunk_size=2)
+    )
+    paths, actual = create_path_info(str(DEFAULT_INDEX), str(data / "test-extract-info.stp"), 2)
+    assert paths == paths_ei
+    pd.testing.assert_frame_equal(actual, extract_path_info(paths_ei, materials))
+
+
+def test_create_path_info_with_issues(data, tmp_path):
+    rules = tmp_path / "rules.txt"
+    rules.write_text("Component1 [m-Unknown]\n", encoding="utf8")
+    with pytest.raises(ValidationError, match="unknown mnemonic 'Unknown'"):
+        create_path_info(str(DEFAULT_INDEX), str(data / "test-extract-info.stp"), 2, str(rules))
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -1,10 +1,19 @@
 from __future__ import annotations
 
+import bz2
+import gzip
+import io
+import lzma
+import zipfile
+
 import pytest
 
 from mapstp.utils._io import (
+    COMPRESSED_SUFFIXES,
     find_first_cell_number,
     find_first_void_cell_number,
+    open_binary,
+    open_text_output,
     read_mcnp_sections,
 )
 
@@ -62,3 +71,66 @@ def test_read_mcnp_sections_with_empty_remainder(data, tmp_path):
     assert sections.surfaces
     assert sections.cards
     assert sections.remainder is None
+
+
+@pytest.mark.parametrize(
+    "suffix,compress",
+    [(".gz", gzip.compress), (".xz", lzma.compress), (".bz2", bz2.compress), (".txt", bytes)],
+)
+def test_open_binary(tmp_path, suffix, compress):
+    path = tmp_path / f"file{suffix}"
+    path.write_bytes(compress(b"0123456789"))
+    with open_binary(path) as stream:
+        stream.seek(5)
+        assert stream.read(2) == b"56"
+
+
+def test_open_binary_zip(tmp_path):
+    path = tmp_path / "archive.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("a.txt", b"aaa")
+    with open_binary(path) as stream:
+        assert stream.read() == b"aaa"
+    with zipfile.ZipFile(path, "a") as archive:
+        archive.writestr("b.txt", b"bbb")
+    with open_binary(path, "b.txt") as stream:
+        assert stream.read() == b"bbb"
+    with pytest.raises(ValueError, match="Select a member of zip archive"), open_binary(path):
+        pass
+    with (
+        pytest.raises(ValueError, match=r"Member 'c\.txt' is not found"),
+        open_binary(path, "c.txt"),
+    ):
+        pass
+    with (
+        pytest.raises(ValueError, match="is not a zip archive"),
+        open_binary(tmp_path / "x.gz", "a.txt"),
+    ):
+        pass
+
+
+@pytest.mark.parametrize(
+    "suffix,decompress",
+    [(".gz", gzip.decompress), (".xz", lzma.decompress), (".bz2", bz2.decompress), (".txt", bytes)],
+)
+@pytest.mark.parametrize("compression_level", [None, 1, 9])
+def test_open_text_output(tmp_path, suffix, decompress, compression_level):
+    path = tmp_path / f"file{suffix}"
+    lines = [f"line {i} ж\n" for i in range(100_000)]
+    with open_text_output(path, compression_level) as stream:
+        stream.writelines(lines)
+    assert decompress(path.read_bytes()).decode("utf8") == "".join(lines)
+
+
+def test_open_text_output_reports_compression_error(tmp_path, monkeypatch):
+    class FailingStream(io.BytesIO):
+        def write(self, _data):
+            msg = "disk is full"
+            raise OSError(msg)
+
+    monkeypatch.setitem(COMPRESSED_SUFFIXES, ".gz", lambda *_args, **_kwargs: FailingStream())
+    with (
+        pytest.raises(OSError, match="disk is full"),
+        open_text_output(tmp_path / "a.gz") as stream,
+    ):
+        stream.write("text")